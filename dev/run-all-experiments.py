@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# Run all experiments of the publication in parallel, the results of all runs are collected in output/results.csv
+
+import argparse
+
+from schedSim.sweep import Sweep, grid
+
+TYPES = ["dkrz", "dkrz-2017", "dkrz-2017-832", "lrz-2017", "lrz", "lrz-744"]
+TIMELINES = ["timeline-fake-data2", "timeline2", "timeline-sine"]
+PRICE_AWARE = ["FIFOPriceAwareShutdown", "PriceAwareShutdown", "EnforcePriceAwareShutdown"]
+SCHEDULERS = ["FIFO", "FIFOBackfill", "FIFOBackfillDelay", "FIFOBackfillShutdown", "FIFOBackfillShutdownDelay", "BiggestFirstBackfill", "LongestFirstBackfill"]
+
+def systems(types):
+  return [{"type" : t, "input" : "data/%s/data.p" % t, "configuration" : "data/%s/configuration.py" % t} for t in types]
+
+def stockPrices():
+  return [{"energyModel" : "HourlyStockPrice", "energyModelArgument" : "eex/%s.csv" % d, "timeline" : d} for d in TIMELINES]
+
+def experiments(types, limitCount):
+  runs = []
+  runs += grid("output/{type}/HourlyStockPrice/{timeline}/{scheduler}-{schedulerArgument}", system = systems(types), energy = stockPrices(), scheduler = PRICE_AWARE, schedulerArgument = ["12", "24", "36", "48", "72", "96"], limitCount = [limitCount])
+  runs += grid("output/{type}/HourlyStockPrice/{timeline}/{scheduler}", system = systems(types), energy = stockPrices(), scheduler = SCHEDULERS, limitCount = [limitCount])
+  runs += grid("output/{type}/DayNightPrice/{scheduler}-{schedulerArgument}", system = systems(types), energyModel = ["DayNightPrice"], scheduler = PRICE_AWARE, schedulerArgument = ["12", "24", "36"], limitCount = [limitCount])
+  runs += grid("output/{type}/{energyModel}/{scheduler}", system = systems(types), energyModel = ["FixedPrice", "DayNightPrice"], scheduler = SCHEDULERS, limitCount = [limitCount])
+  return runs
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Run all experiments')
+  parser.add_argument('--types', type=str, help='Comma separated list of the systems to simulate', default=",".join(TYPES))
+  parser.add_argument('--processes', type=int, help='The number of simulations to run in parallel, default is the number of cores')
+  parser.add_argument('--limit-count', type=int, help='Limit the number of jobs to simulate', default=100000000)
+  parser.add_argument('--results', type=str, help='The CSV file collecting the results of all runs', default="output/results.csv")
+  parser.add_argument('--no-statistics', action="store_true", help='Do not run analysis/statistics.R for every run', default=False)
+  parser.add_argument('--rerun', action="store_true", help='Run experiments whose output exists again', default=False)
+  parser.add_argument('--dry-run', action="store_true", help='Print the runs only', default=False)
+  args = parser.parse_args()
+
+  runs = experiments(args.types.split(","), args.limit_count)
+  if args.dry_run:
+    for r in runs:
+      print(r)
+  else:
+    sweep = Sweep(runs, args.processes, args.results, not args.no_statistics, args.rerun)
+    exit(1 if sweep.run() > 0 else 0)
@@ -1,5 +1,7 @@
-import datetime
 import csv
+import numpy
+
+from schedSim.localTime import epochToNaive
 
 class baseEnergyCostModel:
   def initTimestamp(self, startTime):
@@ -15,6 +17,16 @@ class baseEnergyCostModel:
     '''Hourly price for the given timestamp'''
     return 0
 
+  def timestampPrices(self, timestamp, hours):
+    '''Hourly prices for the given number of hours from the timestamp on'''
+    return [self.timestampPrice(timestamp + i * 3600) for i in range(hours)]
+
+  def energyCostsBatch(self, startTimes, endTimes, consumedEnergy):
+    '''Costs of the intervals [startTimes, endTimes) given as arrays with the consumed power, returns an array'''
+    (startTimes, endTimes, consumedEnergy) = numpy.broadcast_arrays(startTimes, endTimes, consumedEnergy)
+    costs = [self.energyCosts(s, e, c) for (s, e, c) in zip(startTimes.flat, endTimes.flat, consumedEnergy.flat)]
+    return numpy.array(costs, dtype=numpy.float64).reshape(startTimes.shape)
+
 class FixedPriceModel(baseEnergyCostModel):
   costsEnergyPerKWH = 0.145
   #  costsEnergyPerKWH = 0.14 DKRZ
@@ -27,43 +39,62 @@ class FixedPriceModel(baseEnergyCostModel):
     v = (endTime - startTime) * consumedEnergy * self.costsEnergyPerKWH / 1000.0 / 3600.0
     return v
 
+  def energyCostsBatch(self, startTimes, endTimes, consumedEnergy):
+    return (numpy.asarray(endTimes) - numpy.asarray(startTimes)) * numpy.asarray(consumedEnergy) * self.costsEnergyPerKWH / 1000.0 / 3600.0
+
+def _hourSplit(startTimes, durations):
+  '''Split the intervals at the full hours of the local time into the seconds of the first hour, the number of full hours and the seconds of the last hour'''
+  first = numpy.minimum(3600 - epochToNaive(startTimes) % 3600, durations)
+  rest = durations - first
+  return (first, (rest // 3600).astype(numpy.int64), rest % 3600)
+
 class HourlyPriceModel(baseEnergyCostModel):
-    price = {}
+    '''Prices per hour of the local day, the costs of the following hours are looked up in the cumulative costs of two days.
+    The hours of an interval are counted from the local hour of its start, thus, a change of the daylight saving time is not considered within an interval.'''
+
+    def __init__(self, price):
+      # price: the price for each of the 24 hours
+      self.price = numpy.array([price[h] for h in range(24)], dtype=numpy.float64)
+      self.cumulative = numpy.concatenate(([0.0], numpy.cumsum(numpy.tile(self.price, 2)) * 3600))
+      self.dayCosts = self.cumulative[24]
 
     def timestampPrice(self, timestamp):
-      hour = datetime.datetime.fromtimestamp(timestamp).hour
+      hour = epochToNaive(timestamp) // 3600 % 24
       return self.price[hour]
 
+    def _fullHours(self, hour, hours):
+      'Costs per watt of the given number of full hours from the hour of the day'
+      return hours // 24 * self.dayCosts + (self.cumulative[hour + hours % 24] - self.cumulative[hour])
+
     def energyCosts(self, startTime, endTime, consumedEnergy):
-      # Inefficient way of computing for large intervalls, but mostly a high frequency of jobs is assumed.
       duration = (endTime - startTime)
-      startDate = datetime.datetime.fromtimestamp(startTime)
+      naive = epochToNaive(startTime)
+      hour = naive // 3600 % 24
 
       # compute up to the full hour
-      tSec = (59 - startDate.minute) * 60 + 60 - startDate.second
+      tSec = 3600 - naive % 3600
 
       if tSec < duration:
         duration = duration - tSec
-        curHour = startDate.hour
-        costs = self.price[curHour] * consumedEnergy * tSec
-        #print("   " + str(tSec) + " h:" + str(curHour))
-
         durationHours = int(duration / 3600)
-        for i in range(0, durationHours):
-          curHour = (curHour + 1) % 24
-          #print(" h " + str(curHour))
-          costs += self.price[curHour] * consumedEnergy * 3600
-        curHour = (curHour + 1) % 24
-        duration = duration % 3600
-        #print(" R " + str(duration) + " h: " + str(curHour))
-        costs += self.price[curHour] * consumedEnergy * duration
+        nextHour = (hour + 1) % 24
+        costs = self.price[hour] * tSec + self._fullHours(nextHour, durationHours) + self.price[(nextHour + durationHours) % 24] * (duration % 3600)
       else:
-        costs = self.price[startDate.hour] * consumedEnergy * duration
+        costs = self.price[hour] * duration
 
+      costs = float(costs) * consumedEnergy
       assert costs >= 0
 
       return costs / 1000.0 / 3600.0
 
+    def energyCostsBatch(self, startTimes, endTimes, consumedEnergy):
+      startTimes = numpy.asarray(startTimes)
+      (first, hours, last) = _hourSplit(startTimes, numpy.asarray(endTimes) - startTimes)
+      hour = epochToNaive(startTimes) // 3600 % 24
+      nextHour = (hour + 1) % 24
+      costs = self.price[hour] * first + self._fullHours(nextHour, hours) + self.price[(nextHour + hours) % 24] * last
+      return costs * consumedEnergy / 1000.0 / 3600.0
+
 class DayNightPriceModel(HourlyPriceModel):
   costsEnergyPerKWHDay   = 0.16675
   costsEnergyPerKWHNight = 0.1
@@ -74,56 +105,89 @@ class DayNightPriceModel(HourlyPriceModel):
   # Expensive:
   # https://www.swm.de/geschaeftskunden/m-strom/gewerbekunden/m-strom-business/m-strom-business-komfort.html
   def __init__(self):
+    price = {}
     for i in range(0, 24):
-      self.price[i] = self.costsEnergyPerKWHNight
+      price[i] = self.costsEnergyPerKWHNight
     for i in range(self.dayStarts, self.dayEnds):
-      self.price[i] = self.costsEnergyPerKWHDay
+      price[i] = self.costsEnergyPerKWHDay
+    super().__init__(price)
 
 
 class HourlyStockPriceModel(baseEnergyCostModel):
+    '''Prices of consecutive hours read from a CSV file, the first hour starts at the first timestamp of the simulation.
+    The hours are stored in an array with the cumulative costs, thus, the costs of any interval are computed in O(1).'''
     firstTime = None
-    price = {}
 
     def __init__(self, filename):
+      price = {}
       with open(filename, 'r') as csvfile:
         csvreader = csv.DictReader(csvfile, delimiter=',', quotechar='"')
         for l in csvreader:
-          self.price[int(l[""])] = float(l["price"]) # price was in euro
+          price[int(l[""])] = float(l["price"]) # price was in euro
+      if len(price) == 0:
+        raise Exception("No prices in %s" % filename)
+      self.firstHour = min(price)
+      self.lastHour = max(price)
+      if len(price) != self.lastHour - self.firstHour + 1:
+        raise Exception("The hours in %s are not consecutive" % filename)
+      # a zero price after the last hour, it is looked up for intervals that end in the last hour
+      self.price = numpy.array([price[h] for h in range(self.firstHour, self.lastHour + 1)] + [0.0], dtype=numpy.float64)
+      self.cumulative = numpy.concatenate(([0.0], numpy.cumsum(self.price) * 3600))
+
+    def _hour(self, time):
+      'The index of the price of the hour of the time'
+      return int((time - self.firstTime) / 3600) + 1 - self.firstHour
+
+    def _checkHours(self, first, last):
+      if first < 0 or last > self.lastHour - self.firstHour:
+        raise Exception("No price for the hours %d to %d" % (first + self.firstHour, last + self.firstHour))
 
     def timestampPrice(self, time):
-      timestamp = int((time - self.firstTime) / 3600) + 1
-      return self.price[timestamp]
+      hour = self._hour(time)
+      self._checkHours(hour, hour)
+      return self.price[hour]
+
+    def timestampPrices(self, time, hours):
+      if time < self.firstTime:
+        return super().timestampPrices(time, hours)
+      hour = self._hour(time)
+      self._checkHours(hour, hour + hours - 1)
+      return self.price[hour : hour + hours].tolist()
 
     def energyCosts(self, startTime, endTime, consumedEnergy):
       #print("EnergyCosts: %d %d %.0f" % ( startTime, endTime, consumedEnergy))
       assert consumedEnergy >= 0
-      timestamp =  int ((startTime - self.firstTime) / 3600) + 1
+      hour = self._hour(startTime)
 
       duration = (endTime - startTime)
       assert duration > 0
-      startDate = datetime.datetime.fromtimestamp(startTime)
-      #assert self.price[timestamp] > 0 This may be allowed!
+      #assert self.price[hour] > 0 This may be allowed!
 
       # compute up to the full hour
-      tSec = (59 - startDate.minute) * 60 + 60 - startDate.second
+      tSec = 3600 - epochToNaive(startTime) % 3600
       if tSec < duration:
         duration = duration - tSec
-        costs = self.price[timestamp] * consumedEnergy * tSec
-
-        durationHours = int(duration / 3600)
-        for i in range(0, durationHours):
-          timestamp += 1
-          #print(" h " + str(curHour))
-          costs = costs + self.price[timestamp] * consumedEnergy * 3600
-        timestamp += 1
-        duration = duration % 3600
-        #print(" R " + str(duration) + " h: " + str(timestamp))
-        costs = costs + self.price[timestamp] * consumedEnergy * duration
+        last = hour + int(duration / 3600) + 1
+        self._checkHours(hour, last)
+        costs = self.price[hour] * tSec + (self.cumulative[last] - self.cumulative[hour + 1]) + self.price[last] * (duration % 3600)
       else:
-        costs = self.price[timestamp] * consumedEnergy * duration
+        self._checkHours(hour, hour)
+        costs = self.price[hour] * duration
 
       #assert costs >= 0
-      return costs / 1000.0 / 3600.0
+      return float(costs) * consumedEnergy / 1000.0 / 3600.0
+
+    def energyCostsBatch(self, startTimes, endTimes, consumedEnergy):
+      startTimes = numpy.asarray(startTimes)
+      duration = numpy.asarray(endTimes) - startTimes
+      assert numpy.all(duration > 0)
+      hour = ((startTimes - self.firstTime) / 3600).astype(numpy.int64) + 1 - self.firstHour
+      (first, hours, remainder) = _hourSplit(startTimes, duration)
+      last = numpy.where(first < duration, hour + hours + 1, hour)
+      if len(hour) > 0:
+        self._checkHours(hour.min(), last.max())
+      costs = self.price[hour] * first + (self.cumulative[hour + hours + 1] - self.cumulative[hour + 1]) + self.price[hour + hours + 1] * remainder
+      return costs * consumedEnergy / 1000.0 / 3600.0
 
 class energyCostModelFactory:
   def createModel(name, arg):
@@ -0,0 +1,73 @@
+from collections import deque
+from heapq import heappop, heappush
+
+# the operation is stored in the lower bits of the key
+OP_BITS = 3
+
+class EventQueue:
+  '''Priority queue of the events (time, op, job) of the simulator.
+  Events are ordered by the integer time, then by the operation and then by the order they are pushed.
+  Events with the same time and operation are kept in one bucket, as HPC traces contain many events in the same second only the buckets are kept in a heap.
+  Times must be whole seconds, e.g., the failure model rounds its times up.'''
+
+  def __init__(self):
+    self.keys = [] # heap of the keys time * 8 + op of the buckets
+    self.buckets = {} # key -> event (time, op, job) or a deque of events if several exist
+    self.count = 0
+
+  def push(self, time, op, job = None):
+    if type(time) is not int:
+      if time != int(time):
+        raise Exception("The time of an event must be whole seconds: %s" % time)
+      time = int(time)
+    key = (time << OP_BITS) | op
+    bucket = self.buckets.get(key)
+    if bucket is None:
+      self.buckets[key] = (time, op, job)
+      heappush(self.keys, key)
+    elif type(bucket) is deque:
+      bucket.append((time, op, job))
+    else:
+      self.buckets[key] = deque((bucket, (time, op, job)))
+    self.count = self.count + 1
+
+  def pop(self):
+    'Remove and return the first event'
+    key = self.keys[0]
+    bucket = self.buckets[key]
+    self.count = self.count - 1
+    if type(bucket) is deque:
+      event = bucket.popleft()
+      if bucket:
+        return event
+    else:
+      event = bucket
+    del self.buckets[key]
+    heappop(self.keys)
+    return event
+
+  def events(self, op = None):
+    'The events in no particular order, only the events of the operation if it is given'
+    for (key, bucket) in self.buckets.items():
+      if op != None and key & ((1 << OP_BITS) - 1) != op:
+        continue
+      if type(bucket) is deque:
+        yield from bucket
+      else:
+        yield bucket
+
+  def precedes(self, time, op):
+    'True if the event (time, op) is popped before all events of the queue'
+    return not self.keys or ((time << OP_BITS) | op) < self.keys[0]
+
+  def nextTime(self):
+    'The time of the first event or None if the queue is empty'
+    if not self.keys:
+      return None
+    return self.keys[0] >> OP_BITS
+
+  def __len__(self):
+    return self.count
+
+  def __bool__(self):
+    return self.count > 0
@@ -1,17 +1,43 @@
+import math
 import numpy
 
 class FailureModelMTTBF:
+  '''Nodes fail after exponentially distributed times with the mean nodeMTBF and are repaired after normally distributed times.
+  The first failure of n nodes is exponentially distributed with the mean nodeMTBF / n, thus, one random number is needed per check.
+  The random numbers are drawn in batches of batchSize.
+  The times are rounded up to whole seconds as the events of the simulator are, thus, a failure or repair never happens before its drawn time.'''
+
+  batchSize = 65536
+
   def setCluster(self, cluster):
     self.c = cluster
+    self.exponentials = []
+    self.normals = []
 
-  def checkWhenJobFails(self, nodeCount, jobRuntime):
-    fail = numpy.random.exponential(self.c.nodeMTBF, nodeCount)
+  def _exponential(self):
+    if not self.exponentials:
+      self.exponentials = numpy.random.standard_exponential(self.batchSize).tolist()
+    return self.exponentials.pop()
+
+  def _normal(self):
+    if not self.normals:
+      self.normals = numpy.random.standard_normal(self.batchSize).tolist()
+    return self.normals.pop()
 
-    mn = min(fail)
+  def _firstFailure(self, nodeCount):
+    return self._exponential() * self.c.nodeMTBF / nodeCount
+
+  def timeUntilNodeFails(self, nodeCount):
+    'The time until the first of the nodes fails'
+    return math.ceil(self._firstFailure(nodeCount))
+
+  def checkWhenJobFails(self, nodeCount, jobRuntime):
+    'The job fails if the drawn time is before its end, the failure is rounded up to at most the runtime'
+    mn = self._firstFailure(nodeCount)
     if mn < jobRuntime:
-      return mn
+      return math.ceil(mn)
     return None
 
   def timeUntilNodeIsBack(self):
-     vals = numpy.random.normal(loc=self.c.nodeMTTR, scale=self.c.nodeMTTRdeviation, size=1)
-     return max(vals[0], self.c.nodeMinRepairTime)
+     val = self.c.nodeMTTR + self.c.nodeMTTRdeviation * self._normal()
+     return math.ceil(max(val, self.c.nodeMinRepairTime))
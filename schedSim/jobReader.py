@@ -1,10 +1,20 @@
+import contextlib
+import datetime
+import heapq
+import io
+import multiprocessing
+import os
 import re
 import sys
+import tempfile
 import time
 import dateutil.parser
+import numpy
 import pickle
 
 from schedSim.jobs import Job
+from schedSim.jobTrace import JobTrace
+from schedSim.traceParser import BulkTraceParser, SLURM_HEADER, LRZ_HEADER
 from schedSim.jobspawner import JobSpawner
 
 class JobReader(JobSpawner):
@@ -49,15 +59,106 @@ class JobReader(JobSpawner):
           return -1
       return ((int(m.group("day")) * 24 + int(m.group("hour")))*60 + int(m.group("min")))*60 + int(m.group("sec"))
 
-  def prepareSlurm(self, fileList, outFile, delim="|"):
-      'This function reads the input for Slurm and creates the required input for jobs'
+  # a TraceCache to parse text files once and then load them from the cache, None parses them every time
+  cache = None
+
+  # SLURM files of at least this size are parsed by parseProcesses processes, None uses all cores
+  parallelParseBytes = 64 * 1024 * 1024
+  parseProcesses = None
+
+  # number of jobs sorted in memory before they are written as a run to a temporary file
+  prepareRunLength = 1000000
+
+  def _parseSlurmTimestamp(self, timestamp):
+      'sacct prints timestamps in the ISO format which are parsed quickly, other formats are parsed by dateutil'
+      if len(timestamp) == 19:
+          try:
+              return datetime.datetime.fromisoformat(timestamp)
+          except ValueError:
+              pass
+      return dateutil.parser.parse(timestamp)
+
+  def prepareSlurm(self, fileList, outFile, delim="|", processes = None, tmpDir = None):
+      '''This function reads the input for Slurm and creates the required input for jobs
+      The files are processed in parallel, each one is written as runs of sorted jobs into temporary files which are merged by submission time.'''
       fmt = "jobid,partition,NNodes,NTasks,ReqMem,Submit,Start,Elapsed,Account,User,Timelimit,ConsumedEnergy,Priority,State,MaxRSS,MaxVMSize,AveRSS,AveVMSize,jobname".split(",")
-      re_int = re.compile("^[0-9]+$")
 
-      out = open(outFile, "w")
-      jobs = []
+      if processes == None:
+          processes = min(len(fileList), multiprocessing.cpu_count())
       stats = {"INVALID": 0}
-      for f in fileList:
+      total_sum = 0
+      runs = []
+      lastJobs = []
+      with tempfile.TemporaryDirectory(prefix="schedsim-prepare-", dir=tmpDir) as runDir:
+          tasks = [(fileIdx, f, delim, runDir) for fileIdx, f in enumerate(fileList)]
+          pool = None
+          if processes > 1:
+              pool = multiprocessing.Pool(processes)
+              results = pool.imap(self._prepareSlurmFile, tasks)
+          else:
+              results = map(self._prepareSlurmFile, tasks)
+
+          # The BatchOnly time of the last job of a file is set by the steps at the beginning of the next file
+          last = None
+          for (output, fileStats, fileSum, fileRuns, carry, pending) in results:
+              sys.stdout.write(output)
+              for k, v in fileStats.items():
+                  stats[k] = stats.get(k, 0) + v
+              total_sum = total_sum + fileSum
+              runs.extend(fileRuns)
+              if carry != None and last != None:
+                  last[3] = carry
+              if pending != None:
+                  if last != None:
+                      lastJobs.append(last)
+                  last = pending
+          if last != None:
+              lastJobs.append(last)
+          if pool != None:
+              pool.close()
+              pool.join()
+          lastJobs.sort()
+
+          # Sort jobs based on submission date, jobs with the same date keep the order of the input
+          out = open(outFile, "w")
+          out.write("%s\n" % "|".join(fmt))
+          total_sum_batch_only = 0
+          for (submit, fileIdx, seq, BatchOnly, line) in heapq.merge(*[self._readRun(r) for r in runs], lastJobs):
+              out.write("%s|%s\n" % (line, BatchOnly))
+              total_sum_batch_only = total_sum_batch_only + BatchOnly
+          out.close()
+
+      stats["job_runtime_node_years"] = total_sum / 3600.0 / 365 / 24
+      stats["job_runtime_batch_only_node_years"] = total_sum_batch_only / 3600.0 / 365 / 24
+
+      print(stats)
+
+  def _readRun(self, filename):
+      with open(filename, "r") as fd:
+          for l in fd:
+              (submit, fileIdx, seq, BatchOnly, line) = l[:-1].split("|", 4)
+              yield [int(submit), int(fileIdx), int(seq), int(BatchOnly), line]
+
+  def _writeRun(self, jobs, filename):
+      jobs.sort()
+      with open(filename, "w") as fd:
+          for j in jobs:
+              fd.write("%d|%d|%d|%s|%s\n" % tuple(j))
+
+  def _prepareSlurmFile(self, task):
+      '''Convert one file into sorted runs.
+      Returns the printed output, the statistics, the runs, the BatchOnly time for the last job of the previous file and the last job of this file as its BatchOnly time is not final.'''
+      (fileIdx, f, delim, runDir) = task
+      re_int = re.compile("^[0-9]+$")
+      output = io.StringIO()
+      stats = {"INVALID": 0}
+      total_sum = 0
+      runs = []
+      jobs = []
+      seq = 0
+      carry = None
+
+      with contextlib.redirect_stdout(output):
           elapsedBatch = -1
           fd = open(f, "r")
           for l in fd:
@@ -79,8 +180,11 @@ class JobReader(JobSpawner):
                       elapsedBatch = elapsedBatch - Elapsed
                   continue
 
-              if elapsedBatch != -1 and len(jobs) > 0:
-                  jobs[-1][0] = elapsedBatch
+              if elapsedBatch != -1:
+                  if seq > 0:
+                      jobs[-1][3] = elapsedBatch
+                  else:
+                      carry = elapsedBatch
               elapsedBatch = 0
               if State.startswith("CANCELLED"):
                   State = "CANCEL"
@@ -111,130 +215,103 @@ class JobReader(JobSpawner):
               if ppn == -1:
                   ppn = 1
 
-              jobs.append([0,
-                jobid,jobname,partition,
+              # all jobs but the last one are final
+              if len(jobs) > self.prepareRunLength:
+                  runs.append(os.path.join(runDir, "%d-%d" % (fileIdx, len(runs))))
+                  self._writeRun(jobs[:-1], runs[-1])
+                  jobs = jobs[-1:]
+
+              Submit = self._parseSlurmTimestamp(Submit)
+              line = "%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s" % (jobid,jobname,partition,
                 nnodes,
                 ppn,
                 self._parseNodeMemory(ReqMem, ppn),
-                dateutil.parser.parse(Submit),
-                dateutil.parser.parse(Start),
+                Submit,
+                self._parseSlurmTimestamp(Start),
                 Elapsed,
                 Account,
                 User,
                 self._parseSlurmDuration(Timelimit),
                 self._parseIntVal(ConsumedEnergy),
                 Priority,
-                State])
+                State)
+              jobs.append([int(time.mktime(Submit.timetuple())), fileIdx, seq, 0, line])
+              seq = seq + 1
+              total_sum = total_sum + Elapsed*nnodes
           fd.close()
 
-      # Sort jobs based on submission date
-      jobs.sort(key=lambda x: int(time.mktime(x[7].timetuple()))) # WARNING crucial position
-
-      out.write("%s\n" % "|".join(fmt))
-      total_sum = 0
-      total_sum_batch_only = 0
-      for j in jobs:
-          (BatchOnly,jobid,jobname,partition,NNodes,NTasks,ReqMem, Submit, Start, Elapsed,Account,User,Timelimit,ConsumedEnergy,Priority,State) = j
-          out.write("%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s\n" % (jobid,jobname,partition,NNodes,NTasks,ReqMem, Submit, Start, Elapsed,Account,User,Timelimit,ConsumedEnergy,Priority,State,BatchOnly))
-          total_sum = total_sum + Elapsed*NNodes
-          total_sum_batch_only = total_sum_batch_only + BatchOnly
-      out.close()
-
-      stats["job_runtime_node_years"] = total_sum / 3600.0 / 365 / 24
-      stats["job_runtime_batch_only_node_years"] = total_sum_batch_only / 3600.0 / 365 / 24
-
-      print(stats)
+      pending = jobs.pop() if jobs else None
+      if jobs:
+          runs.append(os.path.join(runDir, "%d-%d" % (fileIdx, len(runs))))
+          self._writeRun(jobs, runs[-1])
+      return (output.getvalue(), stats, total_sum, runs, carry, pending)
 
   def _parseLRZ(self, inFile, limitCount = 10000000000, partition = None):
-      jobs = []
-      fd = open(inFile, "r")
-      header = fd.readline()
-      if (header != "Scheduler assigned job id|Submission Time|Start Time|End Time|Status|Energy Tag|Number of Utilized Nodes|EtS (kWh)|APC (W)\n"):
-          print("[Reader] Warning could not find proper header!")
-      lineNo = 2
-      for line in fd:
-          (jobid,Submit,Start,End,State,EnergyTag,NNodes, ETS, apc) = line.split("|")
-
-          Submit = int(time.mktime(dateutil.parser.parse(Submit).timetuple()))
-          # fix too early start times:
-          if Submit < 1388530800:
-              Submit = 1388530800
-          Elapsed = int(time.mktime(dateutil.parser.parse(End).timetuple())) - int(time.mktime(dateutil.parser.parse(Start).timetuple()))
-
-          if State == "Removed" and Elapsed < 2: # Skip
-            continue
-
-          try:
-            apc = float(apc)
-          except:
-            apc = 0
-            print("Error parsing: %s (will set APC to 0)" % line.strip())
-
-          lineNo = lineNo + 1
-          if Elapsed <= 0:
-            print("Job is empty! %s" % jobid)
-          else:
-            jobs.append(Job(jobid, EnergyTag, int(NNodes), int(NNodes), Submit, [Elapsed], [], ETS=ETS, APC=apc))
-
-          if len(jobs) % 10000 == 0:
-              print(len(jobs))
-          if len(jobs) >= limitCount:
-            print("[Reader] Limit reached %d" % limitCount)
-            break
-      fd.close()
-      jobs = sorted(jobs, key=lambda x: x.submissionTime)
-      #for j in jobs:
-      #      print(j)
-      return jobs
-
-
+      return self._parseTrace(inFile, limitCount, partition).toJobs()
 
   def _parseFile(self, inFile, limitCount = 10000000000, partition = None):
-      jobs = []
+      return self._parseTrace(inFile, limitCount, partition).toJobs()
+
+  def _openFile(self, inFile, limitCount, partition):
+      'Open the file and return it together with a parser and its function for the lines of the file'
       fd = open(inFile, "r")
       header = fd.readline()
-      if (header == "Scheduler assigned job id|Submission Time|Start Time|End Time|Status|Energy Tag|Number of Utilized Nodes|EtS (kWh)|APC (W)\n"):
-        fd.close()
-        return self._parseLRZ(inFile, limitCount, partition)
-
-      if(header != "jobid|jobname|partition|NNodes|NTasks|ReqMem|Submit|Start|Elapsed|Account|User|Timelimit|ConsumedEnergy|Priority|State|BatchOnly\n"):
+      parser = BulkTraceParser(limitCount, partition)
+      if header == LRZ_HEADER:
+        return (fd, parser, parser.parseLRZLines)
+      if header != SLURM_HEADER:
           print("[Reader] Warning could not find proper header!")
-
-      oldsubmissionTime = 0
-      lineNo = 2
-      for line in fd:
-          (jobid,jobname,job_partition,NNodes,NTasks,ReqMem, Submit, Start, Elapsed, Account,User,Timelimit,ConsumedEnergy,Priority,State,BatchOnly) = line.split("|")
-          if partition != None and not job_partition in partition:
-              continue
-
-          Submit = int(time.mktime(dateutil.parser.parse(Submit).timetuple()))
-          if Submit < oldsubmissionTime:
-              print("[Reader] WARNING: submissions are not sorted incrementally, line: %d" % lineNo)
-
-          oldsubmissionTime = Submit
-          lineNo = lineNo + 1
-          jobs.append(Job(jobid, jobname, int(NNodes), int(NTasks), Submit, [int(Elapsed)], [], Account, User, partition=job_partition))
-
-          if len(jobs) % 10000 == 0:
-              print(len(jobs))
-          if len(jobs) >= limitCount:
-            print("[Reader] Limit reached %d" % limitCount)
-            break
-      fd.close()
-      return jobs
+      return (fd, parser, parser.parseSlurmLines)
+
+  def _parseTrace(self, inFile, limitCount = 10000000000, partition = None):
+      'Parse the SLURM or LRZ file into a JobTrace'
+      (fd, parser, parseLines) = self._openFile(inFile, limitCount, partition)
+      processes = self.parseProcesses or multiprocessing.cpu_count()
+      with fd:
+        if parseLines == parser.parseSlurmLines and processes > 1 and os.path.getsize(inFile) >= self.parallelParseBytes:
+          trace = parser.parseSlurmFileParallel(inFile, processes)
+        else:
+          trace = parser.parseFile(fd, parseLines)
+      if parseLines == parser.parseLRZLines:
+        # LRZ traces must be sorted after reading
+        trace = trace[numpy.argsort(trace.columns["submissionTime"], kind="stable")]
+      return trace
+
+  def _iterFile(self, inFile, limitCount = 10000000000, partition = None):
+      'Generator returning the jobs in the order of the file'
+      (fd, parser, parseLines) = self._openFile(inFile, limitCount, partition)
+      if parseLines == parser.parseLRZLines:
+        fd.close()
+        yield from self._parseTrace(inFile, limitCount, partition)
+        return
+      with fd:
+        for chunk in parser.chunks(fd, parseLines):
+          yield from chunk
 
 
   def convertToBinary(self, inFile, outFile, limitCount = 10000000000, partition = None):
     'Converting a TXT file to binary is more efficient but not mandatory'
     jobs = self._parseFile(inFile, limitCount, partition)
-    pickle.dump( jobs, open( outFile, "wb" ) )
+    JobReader.convertJobsToBinary(jobs, outFile)
     return jobs
 
   def convertJobsToBinary(jobs, outFile):
-    'Converting the jobs to binary is more efficient but not mandatory'
+    '''Converting the jobs to binary is more efficient but not mandatory.
+    Files ending with .trace use the columnar format of JobTrace, otherwise pickle is used'''
+    if outFile.endswith(".trace"):
+      if not isinstance(jobs, JobTrace):
+        jobs = JobTrace.fromJobs(jobs)
+      jobs.save(outFile)
+      return
+    if isinstance(jobs, JobTrace):
+      jobs = jobs.toJobs()
     pickle.dump( jobs, open( outFile, "wb" ) )
 
   def jobs(self, inFile, limitCount = 10000000000, partition = None):
+    if inFile.endswith(".trace"):
+        # The columnar trace is memory mapped, the filtered trace is returned instead of a list of jobs
+        return JobTrace.load(inFile).select(limitCount, partition)
+
     if inFile.endswith(".p"):
         jobs = pickle.load( open( inFile, "rb" ) )
         #if limitCount >= len(jobs) and partition == None:
@@ -254,4 +331,15 @@ class JobReader(JobSpawner):
         return ret
 
     # Text file:
+    if self.cache != None:
+        # The parsed trace is stored in the columnar format and memory mapped
+        return self.cache.trace(inFile, limitCount, partition, lambda: self._parseTrace(inFile, limitCount, partition))
     return self._parseFile(inFile, limitCount, partition)
+
+  def streamJobs(self, inFile, limitCount = 10000000000, partition = None):
+    '''Returns the jobs as iterator in the order of the file without reading the whole file.
+    The simulator reads the jobs from the iterator when it reaches their submission time.'''
+    if inFile.endswith(".trace") or inFile.endswith(".p"):
+      # a trace is read lazily anyway
+      return self.jobs(inFile, limitCount, partition)
+    return self._iterFile(inFile, limitCount, partition)
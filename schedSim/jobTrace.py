@@ -0,0 +1,213 @@
+import json
+import struct
+import numpy
+
+from schedSim.jobs import Job
+
+TRACE_MAGIC = b"SSTRACE1"
+TRACE_ALIGNMENT = 64
+
+# Categorical columns are stored as int32 ids into a table of strings, -1 encodes None
+CATEGORICAL_COLUMNS = ["name", "account", "user", "partition"]
+NUMERIC_COLUMNS = ["submissionTime", "nodes", "PPN", "duration", "APC", "ETS"]
+
+class JobTrace:
+  '''This class stores a job trace column-wise in NumPy arrays.
+  Traces can be saved into a single binary file that is opened with numpy.memmap, slicing a trace does not copy the data.
+  Iterating over the trace creates the Job objects on demand.'''
+
+  def __init__(self, columns, categories):
+    self.columns = columns
+    self.categories = categories
+
+  @staticmethod
+  def fromJobs(jobs):
+    'Create a trace from a list of Job objects'
+    categories = {c : [] for c in CATEGORICAL_COLUMNS}
+    lookup = {c : {} for c in CATEGORICAL_COLUMNS}
+    ids = {c : [] for c in CATEGORICAL_COLUMNS}
+    values = {c : [] for c in NUMERIC_COLUMNS}
+    jobids = []
+
+    for j in jobs:
+      if len(j.durations) != 1:
+        raise Exception("The trace format supports only jobs with a single duration: %s" % j)
+      jobids.append(j.jobid)
+      for c in CATEGORICAL_COLUMNS:
+        v = getattr(j, c)
+        if v == None:
+          ids[c].append(-1)
+          continue
+        v = str(v)
+        i = lookup[c].get(v)
+        if i == None:
+          i = len(categories[c])
+          lookup[c][v] = i
+          categories[c].append(v)
+        ids[c].append(i)
+      values["submissionTime"].append(j.submissionTime)
+      values["nodes"].append(j.nodes)
+      values["PPN"].append(j.PPN)
+      values["duration"].append(j.durationMin)
+      values["APC"].append(numpy.nan if j.APC == None else j.APC)
+      values["ETS"].append(JobTrace._parseFloat(j.ETS))
+
+    columns = {}
+    if all(isinstance(x, (int, numpy.integer)) for x in jobids):
+      columns["jobid"] = numpy.array(jobids, dtype=numpy.int64)
+    else:
+      columns["jobid"] = numpy.array([str(x).encode("utf-8") for x in jobids], dtype=bytes)
+    for c in CATEGORICAL_COLUMNS:
+      columns[c] = numpy.array(ids[c], dtype=numpy.int32)
+    for c in ["submissionTime", "nodes", "PPN", "duration"]:
+      columns[c] = numpy.array(values[c])
+      if columns[c].dtype.kind not in "iuf":
+        columns[c] = columns[c].astype(numpy.int64)
+    for c in ["APC", "ETS"]:
+      columns[c] = numpy.array(values[c], dtype=numpy.float64)
+    return JobTrace(columns, categories)
+
+  @staticmethod
+  def concatenate(traces):
+    'Concatenate the traces in order, the categories are merged'
+    categories = {c : [] for c in CATEGORICAL_COLUMNS}
+    lookup = {c : {} for c in CATEGORICAL_COLUMNS}
+    parts = {name : [] for name in traces[0].columns}
+    for t in traces:
+      for name, col in t.columns.items():
+        if name in lookup:
+          # the last entry maps None (-1) to itself
+          mapping = [lookup[name].setdefault(v, len(lookup[name])) for v in t.categories[name]]
+          col = numpy.array(mapping + [-1], dtype=numpy.int32)[col]
+        parts[name].append(col)
+    for c in CATEGORICAL_COLUMNS:
+      categories[c] = list(lookup[c])
+    return JobTrace({name : numpy.concatenate(p) for name, p in parts.items()}, categories)
+
+  @staticmethod
+  def _parseFloat(val):
+    if val == None:
+      return numpy.nan
+    try:
+      return float(val)
+    except ValueError:
+      return numpy.nan
+
+  @staticmethod
+  def load(filename):
+    'Open a trace file, the columns are memory mapped and read lazily'
+    with open(filename, "rb") as fd:
+      magic = fd.read(len(TRACE_MAGIC))
+      if magic != TRACE_MAGIC:
+        raise Exception("Not a trace file: %s" % filename)
+      (headerLength,) = struct.unpack("<Q", fd.read(8))
+      header = json.loads(fd.read(headerLength).decode("utf-8"))
+
+    count = header["count"]
+    columns = {}
+    for name, (dtype, offset) in header["columns"].items():
+      if count == 0:
+        columns[name] = numpy.empty(0, dtype=numpy.dtype(dtype))
+      else:
+        columns[name] = numpy.memmap(filename, dtype=numpy.dtype(dtype), mode="r", offset=offset, shape=(count,))
+    return JobTrace(columns, header["categories"])
+
+  def save(self, filename):
+    'Store the trace in a single file, every column is aligned to allow memory mapping'
+    count = len(self)
+    layout = {}
+    headerLength = 0
+    # The header contains the offsets which depend on the header length, iterate until it is stable
+    while True:
+      offset = self._align(len(TRACE_MAGIC) + 8 + headerLength)
+      for name, col in self.columns.items():
+        layout[name] = (col.dtype.str, offset)
+        offset = self._align(offset + col.nbytes)
+      header = json.dumps({"count" : count, "columns" : layout, "categories" : self.categories}).encode("utf-8")
+      if len(header) == headerLength:
+        break
+      headerLength = len(header)
+
+    with open(filename, "wb") as fd:
+      fd.write(TRACE_MAGIC)
+      fd.write(struct.pack("<Q", headerLength))
+      fd.write(header)
+      for name, col in self.columns.items():
+        fd.seek(layout[name][1])
+        numpy.ascontiguousarray(col).tofile(fd)
+
+  def _align(self, offset):
+    return (offset + TRACE_ALIGNMENT - 1) // TRACE_ALIGNMENT * TRACE_ALIGNMENT
+
+  def __len__(self):
+    return len(self.columns["submissionTime"])
+
+  def __getitem__(self, index):
+    if isinstance(index, (int, numpy.integer)):
+      return self._createJobs(index, index + 1)[0]
+    # slices return views, index arrays or masks return copies
+    return JobTrace({name : col[index] for name, col in self.columns.items()}, self.categories)
+
+  def __iter__(self, chunkSize = 65536):
+    for start in range(0, len(self), chunkSize):
+      yield from self._createJobs(start, min(start + chunkSize, len(self)))
+
+  def toJobs(self):
+    return list(self)
+
+  def _createJobs(self, start, end):
+    'Convert the rows [start, end) into Job objects'
+    cols = {name : col[start:end].tolist() for name, col in self.columns.items()}
+    if self.columns["jobid"].dtype.kind == "S":
+      cols["jobid"] = [x.decode("utf-8") for x in cols["jobid"]]
+    for c in CATEGORICAL_COLUMNS:
+      table = self.categories[c]
+      cols[c] = [None if x == -1 else table[x] for x in cols[c]]
+    for c in ["APC", "ETS"]:
+      cols[c] = [None if x != x else x for x in cols[c]]
+
+    return [Job(jobid, name, nodes, PPN, submissionTime, [duration], [], account, user, partition=partition, ETS=ETS, APC=APC)
+      for (jobid, name, nodes, PPN, submissionTime, duration, account, user, partition, ETS, APC)
+      in zip(cols["jobid"], cols["name"], cols["nodes"], cols["PPN"], cols["submissionTime"], cols["duration"], cols["account"], cols["user"], cols["partition"], cols["ETS"], cols["APC"])]
+
+  def isSorted(self):
+    'True if the jobs are sorted by submission time'
+    t = self.columns["submissionTime"]
+    return bool(numpy.all(t[1:] >= t[:-1]))
+
+  def categoryIds(self, column, values):
+    'Return the ids of the given category values that exist in the trace'
+    table = self.categories[column]
+    return [i for i, v in enumerate(table) if v in values]
+
+  def select(self, limitCount = 10000000000, partition = None):
+    '''Return the jobs of the given partitions that have a valid runtime, up to limitCount jobs.
+    If the selected rows are consecutive, the result is a view on the trace.'''
+    duration = self.columns["duration"]
+    APC = self.columns["APC"]
+    mask = None
+    if partition != None:
+      mask = numpy.isin(self.columns["partition"], self.categoryIds("partition", partition))
+
+    invalid = (duration < 0) | (APC < 0)
+    if mask is not None:
+      invalid &= mask
+    valid = duration > 0
+    valid &= ~invalid
+    if mask is not None:
+      valid &= mask
+
+    rows = numpy.flatnonzero(valid)[:limitCount]
+    # the rows after the last selected job are not read once limitCount is reached
+    cutoff = rows[-1] if len(rows) > 0 and len(rows) == limitCount else len(self)
+    for i in numpy.flatnonzero(invalid[:cutoff]):
+      print("Warning runtime or APC < 0 for %s" % self[int(i)])
+
+    if len(rows) == 0:
+      return self[0:0]
+    if rows[-1] - rows[0] + 1 == len(rows):
+      return self[int(rows[0]):int(rows[-1]) + 1]
+    return self[rows]
+
+  def __repr__(self):
+    return "JobTrace(%d jobs)" % len(self)
@@ -1,62 +1,84 @@
-class Job:
-  'This class represents a job'
-
-  dummy = 0
-
-  jobid = 0
-
-  name = ""
-
-  nodes = 0
-
-  PPN = 0
+import sys
 
-  submissionTime = 0
+NO_DEPENDENCIES = ()
 
-  # durations for certain conditions such as changed frequency
-  durations = []
+def _intern(value):
+  'Categorical strings such as the account are shared between all jobs'
+  if type(value) is str:
+    return sys.intern(value)
+  return value
 
-  # the minimum runtime
-  durationMin = 0
-  durationMax = 0
-
-  dependencies = []
-
-  startTime = 0
-  powerConsumption = 0 # managed externally
-
-  account = None
-  user = None
-  APC = None
+class Job:
+  '''This class represents a job
+  Slots are used as traces contain millions of jobs, categorical strings are interned.'''
 
-  partition = None
+  __slots__ = ("jobid", "name", "nodes", "PPN", "submissionTime", "_durations", "durationMin", "durationMax", "dependencies", "startTime", "endTime", "powerConsumption", "account", "user", "APC", "ETS", "partition", "dummy", "nodeSet")
 
-  def __init__(self, jobid = 0, name = 0, nodes = 1, PPN = 0, submissionTime = 0, durations = [0], dependencies = [], account = None, user = None, partition = None, ETS = None, dummy = False, APC = None):
+  def __init__(self, jobid = 0, name = 0, nodes = 1, PPN = 0, submissionTime = 0, durations = (0,), dependencies = NO_DEPENDENCIES, account = None, user = None, partition = None, ETS = None, dummy = False, APC = None):
     self.jobid = jobid
-    self.name = name
+    self.name = _intern(name)
     self.nodes = nodes
     self.PPN = PPN
     self.ETS = ETS
     self.APC = APC
     self.submissionTime = submissionTime
+    self.startTime = 0
     self.endTime = 0
+    self.powerConsumption = 0 # managed externally
+    self.nodeSet = None # the nodes of a running job if the simulator tracks the nodes
     self.durations = durations
 
-    self.durationMin = min(durations)
-    self.durationMax = max(durations)
-    assert self.durationMin >= 0
-
-    self.dependencies = dependencies
-    self.account = account
-    self.user = user
-    self.partition = partition
+    self.dependencies = tuple(dependencies) if dependencies else NO_DEPENDENCIES
+    self.account = _intern(account)
+    self.user = _intern(user)
+    self.partition = _intern(partition)
     self.dummy = dummy
 
     assert name != ""
     assert nodes > 0
     assert PPN >= 0
     assert submissionTime >= 0
+
+  @property
+  def durations(self):
+    'durations for certain conditions such as changed frequency'
+    if self._durations == None:
+      return [self.durationMin]
+    return list(self._durations)
+
+  @durations.setter
+  def durations(self, durations):
+    if len(durations) == 1:
+      # Most jobs have a single duration which is kept in durationMin only
+      self.durationMin = self.durationMax = durations[0]
+      self._durations = None
+      assert self.durationMin >= 0
+      return
     assert len(durations) > 0
+    # the minimum runtime
+    self.durationMin = min(durations)
+    self.durationMax = max(durations)
+    assert self.durationMin >= 0
+    self._durations = tuple(durations)
+
+  def __getstate__(self):
+    return {k : getattr(self, k) for k in self.__slots__}
+
+  def __setstate__(self, state):
+    if isinstance(state, tuple):
+      # pickled by the default protocol for slots: (dict, slots)
+      state = dict(state[0] or {}, **state[1])
+    self.startTime = 0
+    self.endTime = 0
+    self.powerConsumption = 0
+    self.ETS = None
+    self.nodeSet = None
+    for k, v in state.items():
+      if k in ("name", "account", "user", "partition"):
+        v = _intern(v)
+      elif k == "dependencies":
+        v = tuple(v) if v else NO_DEPENDENCIES
+      setattr(self, k, v)
 
   def powerConsumed(self, pstate, cluster):
     if self.APC != None:
@@ -67,7 +89,7 @@ class Job:
 
 
   def __repr__( self ):
-    return "Job(%s, %s, Nodes:%d, PPN:%d, submission:%d, duration:%s, %s, ETC:%s, APC:%s)" % (self.jobid, self.name, self.nodes, self.PPN, self.submissionTime, self.durations, self.dependencies, self.ETS, self.APC)
+    return "Job(%s, %s, Nodes:%d, PPN:%d, submission:%d, duration:%s, %s, ETC:%s, APC:%s)" % (self.jobid, self.name, self.nodes, self.PPN, self.submissionTime, self.durations, list(self.dependencies), self.ETS, self.APC)
 
   def __cmp__(self, other):
     return cmp(self.jobid, other.jobid)
@@ -0,0 +1,47 @@
+import time
+import numpy
+
+# UTC offset in seconds of the local timezone per hour since 1970 (naive local time)
+_hourOffsets = {}
+
+def _hourOffset(hour):
+  offset = _hourOffsets.get(hour)
+  if offset == None:
+    t = hour * 3600
+    # tm_isdst = -1 as for datetime.timetuple() of a naive datetime
+    offset = int(time.mktime(time.struct_time(time.gmtime(t)[:8] + (-1,)))) - t
+    _hourOffsets[hour] = offset
+  return offset
+
+def naiveToEpoch(naive):
+  '''Convert naive local times, given as seconds since 1970-01-01 00:00:00, to the epoch like time.mktime() does.
+  Daylight saving time changes at full hours, thus, mktime() is called once per distinct hour.'''
+  naive = numpy.asarray(naive, dtype=numpy.int64)
+  if len(naive) == 0:
+    return naive
+  hours, inverse = numpy.unique(naive // 3600, return_inverse=True)
+  offsets = numpy.array([_hourOffset(h) for h in hours.tolist()], dtype=numpy.int64)
+  return naive + offsets[inverse.reshape(naive.shape)]
+
+# UTC offset in seconds of the local timezone per hour since the epoch
+_epochOffsets = {}
+
+def _epochOffset(hour):
+  offset = _epochOffsets.get(hour)
+  if offset == None:
+    offset = time.localtime(hour * 3600).tm_gmtoff
+    _epochOffsets[hour] = offset
+  return offset
+
+def epochToNaive(epoch):
+  '''Convert epoch times to naive local times, given as seconds since 1970-01-01 00:00:00, like datetime.fromtimestamp() does.
+  The UTC offset is looked up once per distinct hour, a single time or an array of times may be given.'''
+  if numpy.isscalar(epoch):
+    epoch = int(epoch)
+    return epoch + _epochOffset(epoch // 3600)
+  epoch = numpy.asarray(epoch).astype(numpy.int64)
+  if len(epoch) == 0:
+    return epoch
+  hours, inverse = numpy.unique(epoch // 3600, return_inverse=True)
+  offsets = numpy.array([_epochOffset(h) for h in hours.tolist()], dtype=numpy.int64)
+  return epoch + offsets[inverse.reshape(epoch.shape)]
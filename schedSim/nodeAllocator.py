@@ -0,0 +1,184 @@
+import numpy
+
+# the states of a node
+FREE = 0
+BUSY = 1
+SLEEPING = 2
+BOOTING = 3
+BROKEN = 4
+STATE_NAMES = ["free", "busy", "sleeping", "booting", "broken"]
+
+class NodeSet:
+  'A set of nodes of the cluster, bit i of the mask is set if node i is in the set'
+  __slots__ = ("mask",)
+
+  def __init__(self, mask = 0):
+    self.mask = mask
+
+  def __len__(self):
+    return self.mask.bit_count()
+
+  def __bool__(self):
+    return self.mask != 0
+
+  def __contains__(self, node):
+    return (self.mask >> node) & 1 == 1
+
+  def __iter__(self):
+    mask = self.mask
+    while mask:
+      low = mask & -mask
+      yield low.bit_length() - 1
+      mask ^= low
+
+  def __eq__(self, other):
+    return isinstance(other, NodeSet) and self.mask == other.mask
+
+  def __hash__(self):
+    return hash(self.mask)
+
+  def __repr__(self):
+    return "NodeSet(%s)" % list(self)
+
+  def first(self, count):
+    'The count nodes of the set with the lowest numbers, all nodes if the set is smaller'
+    if count <= 0:
+      return NodeSet()
+    if self.mask.bit_count() <= count:
+      return NodeSet(self.mask)
+    return NodeSet(self.mask & ((1 << (_select(self.mask, count - 1) + 1)) - 1))
+
+  @staticmethod
+  def fromNodes(nodes):
+    mask = 0
+    for n in nodes:
+      mask |= 1 << n
+    return NodeSet(mask)
+
+def _select(mask, k):
+  'The position of the k-th lowest set bit of the mask, counted from 0'
+  lo = 0
+  hi = mask.bit_length()
+  # invariant: less than k + 1 bits are set below lo, at least k + 1 below hi
+  while hi - lo > 1:
+    mid = (lo + hi) >> 1
+    if (mask & ((1 << mid) - 1)).bit_count() > k:
+      hi = mid
+    else:
+      lo = mid
+  return lo
+
+class NodeAllocator:
+  '''The state of every node of the cluster.
+  The nodes of every state are kept in a bitmap of a Python integer, thus, moving a set of nodes or counting them is O(nodes/64).
+  Finding the first nodes of a state uses a binary search over the prefix counts and a contiguous range is found by shifting the bitmap log(count) times.'''
+
+  def __init__(self, count):
+    self.count = count
+    self.states = [0 for s in STATE_NAMES]
+    self.states[FREE] = (1 << count) - 1
+    # the number of failures of every node
+    self.failures = numpy.zeros(count, dtype=numpy.int32)
+
+  def nodes(self, state = FREE):
+    return NodeSet(self.states[state])
+
+  def countOf(self, state = FREE):
+    return self.states[state].bit_count()
+
+  def stateOf(self, node):
+    for (state, mask) in enumerate(self.states):
+      if (mask >> node) & 1:
+        return state
+
+  def firstFit(self, count, state = FREE):
+    'The count nodes of the state with the lowest numbers or None if there are too few'
+    if self.states[state].bit_count() < count:
+      return None
+    return self.nodes(state).first(count)
+
+  def lastFit(self, count, state = FREE):
+    'The count nodes of the state with the highest numbers or None if there are too few'
+    mask = self.states[state]
+    available = mask.bit_count()
+    if available < count:
+      return None
+    if count <= 0:
+      return NodeSet()
+    start = _select(mask, available - count)
+    return NodeSet(mask >> start << start)
+
+  def contiguous(self, count, state = FREE):
+    'The first range of count consecutive nodes of the state or None if there is none'
+    if count <= 0:
+      return NodeSet()
+    mask = self.states[state]
+    length = 1
+    while length < count and mask:
+      # bit i is set if the nodes i to i + length - 1 are in the state
+      shift = min(length, count - length)
+      mask &= mask >> shift
+      length += shift
+    if not mask:
+      return None
+    first = (mask & -mask).bit_length() - 1
+    return NodeSet(((1 << count) - 1) << first)
+
+  def fragments(self, state = FREE):
+    'The number of ranges of consecutive nodes of the state'
+    mask = self.states[state]
+    return (mask & ~(mask << 1)).bit_count()
+
+  def randomNode(self, nodeSet):
+    'A node of the set drawn uniformly'
+    return _select(nodeSet.mask, numpy.random.randint(len(nodeSet)))
+
+  def move(self, nodeSet, fromState, toState):
+    'Move the nodes of the set, they must be in fromState'
+    mask = nodeSet.mask
+    if self.states[fromState] & mask != mask:
+      raise Exception("Nodes are not %s: %s" % (STATE_NAMES[fromState], NodeSet(mask & ~self.states[fromState])))
+    self.states[fromState] ^= mask
+    self.states[toState] |= mask
+
+  def allocate(self, count, contiguous = False):
+    'Make count free nodes busy, a contiguous range is preferred if requested, returns the nodes or None if too few are free'
+    nodeSet = None
+    if contiguous:
+      nodeSet = self.contiguous(count)
+    if nodeSet == None:
+      nodeSet = self.firstFit(count)
+      if nodeSet == None:
+        return None
+    self.move(nodeSet, FREE, BUSY)
+    return nodeSet
+
+  def release(self, nodeSet):
+    self.move(nodeSet, BUSY, FREE)
+
+  def fail(self, node, state):
+    'The node in the state breaks'
+    self.move(NodeSet(1 << node), state, BROKEN)
+    self.failures[node] += 1
+
+  def repair(self, node):
+    self.move(NodeSet(1 << node), BROKEN, FREE)
+
+  def sleep(self, nodeSet):
+    'Put the free nodes of the set to sleep, the sleeping nodes of the set stay asleep'
+    self.move(NodeSet(nodeSet.mask & self.states[FREE]), FREE, SLEEPING)
+
+  def setAwake(self, count):
+    '''Wake up or put free nodes to sleep until count nodes are free.
+    The nodes with the highest numbers are put to sleep and the ones with the lowest numbers are woken up.'''
+    free = self.countOf(FREE)
+    if free > count:
+      self.move(self.lastFit(free - count, FREE), FREE, SLEEPING)
+    elif free < count:
+      nodeSet = self.firstFit(count - free, SLEEPING)
+      if nodeSet == None:
+        raise Exception("Cannot wake up %d nodes, only %d are sleeping" % (count - free, self.countOf(SLEEPING)))
+      self.move(nodeSet, SLEEPING, FREE)
+
+  def __repr__(self):
+    return "NodeAllocator(%s, fragments: %d)" % (", ".join("%s: %d" % (STATE_NAMES[s], self.countOf(s)) for s in range(len(STATE_NAMES))), self.fragments())
@@ -0,0 +1,219 @@
+from bisect import bisect_left, bisect_right, insort
+
+class PendingQueue:
+  '''Order preserving queue of pending jobs for the FIFO schedulers.
+  Removed jobs are replaced by a tombstone (None), thus, removing the first job or a job found during a scan is O(1).
+  Jobs can be put in front of the queue in amortized O(1) time as free slots are kept in front of the head.
+  The tombstones are removed when they exceed the number of jobs, but not while a scan is running.'''
+
+  def __init__(self, jobs = ()):
+    self.items = list(jobs)
+    self.head = 0 # position of the first job
+    self.count = len(self.items)
+
+  def __len__(self):
+    return self.count
+
+  def __bool__(self):
+    return self.count > 0
+
+  def __iter__(self):
+    for (pos, job) in self.scan():
+      yield job
+
+  def first(self):
+    return self.items[self.head]
+
+  def extend(self, jobs):
+    self._compact()
+    length = len(self.items)
+    self.items.extend(jobs)
+    self.count = self.count + len(self.items) - length
+
+  def append(self, job):
+    self.items.append(job)
+    self.count = self.count + 1
+
+  def appendleft(self, job):
+    self._compact()
+    if self.head == 0:
+      free = max(len(self.items), 16)
+      self.items[0:0] = [None] * free
+      self.head = free
+    self.head = self.head - 1
+    self.items[self.head] = job
+    self.count = self.count + 1
+
+  def popleft(self):
+    job = self.items[self.head]
+    self.remove(self.head)
+    return job
+
+  def remove(self, pos):
+    'Remove the job at the position returned by scan()'
+    self.items[pos] = None
+    self.count = self.count - 1
+    if self.count == 0:
+      self.items = []
+      self.head = 0
+      return
+    if pos == self.head:
+      items = self.items
+      head = self.head + 1
+      while items[head] is None:
+        head = head + 1
+      self.head = head
+
+  def scan(self):
+    '''Iterate over the pending jobs in order, returns tuples of (position, job).
+    The job at the returned position may be removed during the iteration.'''
+    self._compact()
+    items = self.items
+    pos = self.head
+    while pos < len(items):
+      job = items[pos]
+      if job is not None:
+        yield (pos, job)
+      pos = pos + 1
+
+  @property
+  def _tombstones(self):
+    return len(self.items) - self.head - self.count
+
+  def _compact(self):
+    if self._tombstones > max(self.count, 1024):
+      self.items = [j for j in self.items[self.head:] if j is not None]
+      self.head = 0
+
+
+class IndexedPendingQueue(PendingQueue):
+  '''PendingQueue with an index of the jobs by their number of nodes for the backfill schedulers.
+  For every number of nodes the positions of the pending jobs are kept in order, a Fenwick tree counts the pending jobs before a position.
+  Thus, the next job that fits on the free nodes and the number of jobs that are skipped until it are found without visiting the skipped jobs.
+  The index is rebuilt when the positions change, i.e., the queue is compacted or padded in front.'''
+
+  # number of jobs that are checked one by one before the index is used, if many jobs fit the scan is cheaper
+  linearScan = 8
+
+  def __init__(self, jobs = ()):
+    super().__init__(jobs)
+    self._rebuild()
+
+  def minNodes(self):
+    'The smallest number of nodes requested by a pending job, None if the queue is empty'
+    if not self.nodeCounts:
+      return None
+    return self.nodeCounts[0]
+
+  def _rebuild(self):
+    items = self.items
+    n = len(items)
+    tree = [0] * (n + 1)
+    buckets = {}
+    for pos in range(self.head, n):
+      job = items[pos]
+      if job is not None:
+        tree[pos + 1] = 1
+        buckets.setdefault(job.nodes, []).append(pos)
+    for i in range(1, n + 1):
+      j = i + (i & -i)
+      if j <= n:
+        tree[j] += tree[i]
+    self.tree = tree
+    self.buckets = buckets
+    self.nodeCounts = sorted(buckets)
+
+  def _countBefore(self, pos):
+    'Number of jobs at the positions before pos'
+    tree = self.tree
+    count = 0
+    while pos > 0:
+      count = count + tree[pos]
+      pos = pos - (pos & -pos)
+    return count
+
+  def jobsAfter(self, pos):
+    'Number of pending jobs after the position'
+    if self.count == 0:
+      return 0
+    return self.count - self._countBefore(pos + 1)
+
+  def _addCount(self, pos, value):
+    tree = self.tree
+    pos = pos + 1
+    while pos < len(tree):
+      tree[pos] += value
+      pos = pos + (pos & -pos)
+
+  def _index(self, pos, job):
+    bucket = self.buckets.get(job.nodes)
+    if bucket is None:
+      self.buckets[job.nodes] = [pos]
+      insort(self.nodeCounts, job.nodes)
+    else:
+      bucket.insert(bisect_left(bucket, pos), pos)
+
+  def _compact(self):
+    items = self.items
+    super()._compact()
+    if self.items is not items:
+      self._rebuild()
+
+  def extend(self, jobs):
+    self._compact()
+    for job in jobs:
+      self.append(job)
+
+  def append(self, job):
+    super().append(job)
+    # extend the Fenwick tree by the new position
+    i = len(self.tree)
+    self.tree.append(1 + self._countBefore(i - 1) - self._countBefore(i - (i & -i)))
+    self._index(i - 1, job)
+
+  def appendleft(self, job):
+    length = len(self.items)
+    super().appendleft(job)
+    if len(self.items) != length: # the positions moved
+      self._rebuild()
+    else:
+      self._addCount(self.head, 1)
+      self._index(self.head, job)
+
+  def remove(self, pos):
+    job = self.items[pos]
+    super().remove(pos)
+    if not self.items:
+      self._rebuild()
+      return
+    self._addCount(pos, -1)
+    bucket = self.buckets[job.nodes]
+    del bucket[bisect_left(bucket, pos)]
+    if not bucket:
+      del self.buckets[job.nodes]
+      del self.nodeCounts[bisect_left(self.nodeCounts, job.nodes)]
+
+  def nextFitting(self, pos, freeNodes):
+    '''Find the first job after the position (or from the head if pos is None) that needs at most freeNodes.
+    Returns a triple: number of skipped jobs, position and job or None if no job fits.'''
+    items = self.items
+    start = self.head if pos is None else min(pos + 1, len(items))
+    skipped = 0
+    while start < len(items) and skipped < self.linearScan:
+      job = items[start]
+      if job is not None:
+        if job.nodes <= freeNodes:
+          return (skipped, start, job)
+        skipped = skipped + 1
+      start = start + 1
+
+    found = None
+    nodeCounts = self.nodeCounts
+    for i in range(bisect_right(nodeCounts, freeNodes)):
+      bucket = self.buckets[nodeCounts[i]]
+      j = bisect_left(bucket, start)
+      if j < len(bucket) and (found is None or bucket[j] < found):
+        found = bucket[j]
+    end = len(items) if found is None else found
+    skipped = skipped + self._countBefore(end) - self._countBefore(start)
+    return (skipped, found, None if found is None else items[found])
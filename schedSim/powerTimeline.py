@@ -0,0 +1,29 @@
+from array import array
+import numpy
+
+class PowerTimeline:
+  '''The power consumption of the cluster over time, recorded during the simulation and integrated afterwards.
+  Every breakpoint (time, power) means that the power was consumed since the previous breakpoint.'''
+
+  def __init__(self, startTime):
+    self.times = array('d', [startTime])
+    self.powers = array('d')
+
+  def __len__(self):
+    return len(self.powers)
+
+  def append(self, time, power):
+    self.times.append(time)
+    self.powers.append(power)
+
+  def integrate(self, energyModel):
+    'Returns the consumed energy in Ws and its costs of the whole timeline'
+    if len(self.powers) == 0:
+      return (0.0, 0.0)
+    times = numpy.frombuffer(self.times, dtype=numpy.float64)
+    powers = numpy.frombuffer(self.powers, dtype=numpy.float64)
+    energy = numpy.dot(numpy.diff(times), powers)
+    # intervals without any power cost nothing
+    used = powers > 0
+    costs = energyModel.energyCostsBatch(times[:-1][used], times[1:][used], powers[used]).sum()
+    return (float(energy), float(costs))
@@ -0,0 +1,122 @@
+import datetime
+import numpy
+
+class PriceWindows:
+  '''Energy prices of the next hours for the price-aware schedulers.
+  The prices are kept with their cumulative sum, thus, the costs of running a job in any window of hours are O(1) and all start windows of a job are evaluated at once with NumPy.
+  The windows are compared in the order of the original loops. If two compared costs differ only by the rounding of the sums, the costs are summed up hour by hour as before and compared again, thus, the chosen windows are the same.'''
+
+  # costs closer than this relative difference are summed up exactly
+  tolerance = 1e-9
+
+  def __init__(self, energyModel, time, hours):
+    self.prices = list(energyModel.timestampPrices(time, hours))
+    self.price = numpy.array(self.prices, dtype=numpy.float64)
+    self.cumulative = numpy.concatenate(([0.0], numpy.cumsum(self.price)))
+    timestamp = datetime.datetime.fromtimestamp(time)
+    self.secondsRemainingThisHour = (59 - timestamp.minute) * 60 + 60 - timestamp.second
+
+  def _close(self, a, b):
+    return abs(a - b) <= self.tolerance * max(abs(a), abs(b))
+
+  def costsNow(self, duration, power):
+    'Costs to run the job now, they are reduced slightly to favorise an immediate start'
+    price = self.prices
+    hoursNeeded = int(duration / 3600)
+    remainingSeconds = duration % 3600
+    tSecRemainThisHour = self.secondsRemainingThisHour
+    if tSecRemainThisHour > remainingSeconds:
+      cPrice = price[0] * remainingSeconds
+    else:
+      cPrice = price[0] * tSecRemainThisHour
+      for h in range(1, hoursNeeded):
+        cPrice += price[h] * 3600
+      tRemaining = duration - tSecRemainThisHour - 3600 * (hoursNeeded - 1)
+      if tRemaining > 0:
+        cPrice += price[hoursNeeded] * tRemaining
+    return cPrice * power / 1000 / 3600 * 0.999
+
+  def idleCosts(self, windows, idlePower, hourlyIdleCosts):
+    '''Costs of keeping the nodes idle until the start of the hours 1 to windows - 1.
+    hourlyIdleCosts: array of the idle costs of every hour'''
+    first = self.prices[0] * self.secondsRemainingThisHour * idlePower / 1000 / 3600
+    # accumulate adds up sequentially like the loops did
+    return numpy.add.accumulate(numpy.concatenate(([first], hourlyIdleCosts[1:windows - 1])))
+
+  def _runCosts(self, start, windows, hoursNeeded, power, exact):
+    'Costs of running the job for the full hours of the windows from start to windows - 1 added to start'
+    if not exact:
+      w = numpy.arange(1, windows)
+      return start + (self.cumulative[w + hoursNeeded] - self.cumulative[w]) * power / 1000
+    hourly = self.price * power / 1000
+    costs = numpy.array(start, dtype=numpy.float64)
+    for h in range(hoursNeeded):
+      costs = costs + hourly[1 + h : windows + h]
+    return costs
+
+  def cheapestShortJob(self, cheapest, remainingSeconds, power, idle):
+    '''Returns the cheapest start hour of a job shorter than an hour or 0 to run it now.
+    idle: the costs of keeping the nodes idle until every hour'''
+    costs = idle + self.price[1:len(idle) + 1] * power * remainingSeconds / 1000 / 3600
+    w = int(numpy.argmin(costs))
+    if costs[w] < cheapest:
+      return w + 1
+    return 0
+
+  def cheapestLongJob(self, cheapest, hoursNeeded, remainingSeconds, power, idlePower):
+    '''Returns the cheapest start window [hour, last] of a job of at least one hour or None to run it now.
+    The job starts either in the hour before the window or it ends in the hour after it (last), idle nodes cost idlePower.
+    The windows are checked until the costs for keeping the nodes idle exceed the cheapest costs.'''
+    windows = len(self.prices) - hoursNeeded - 1
+    idle = self.idleCosts(windows, idlePower, self.price * idlePower / 1000)
+    secondsFullHourEmpty = (3600 - remainingSeconds)
+    w = numpy.arange(1, windows)
+    pLast = self.price[hoursNeeded + w + 1] * (power * remainingSeconds + secondsFullHourEmpty * idlePower) / 1000 / 3600
+    pFirst = self.price[w - 1] * (remainingSeconds * power + (secondsFullHourEmpty - remainingSeconds) * idlePower) / 1000 / 3600
+    last = (pFirst > pLast) | (w == 1)
+    tail = numpy.where(last, pLast, pFirst)
+
+    idle = idle.tolist()
+    last = last.tolist()
+    for exact in (False, True):
+      costs = (self._runCosts(idle, windows, hoursNeeded, power, exact) + tail).tolist()
+      config = None
+      best = cheapest
+      ambiguous = False
+      for i in range(len(costs)):
+        if self._close(idle[i], best) or self._close(costs[i], best):
+          ambiguous = True
+        if idle[i] > best:
+          break
+        if costs[i] < best:
+          best = costs[i]
+          config = [i + 1, last[i]]
+      if not ambiguous:
+        break
+    return config
+
+  def cheapestLongJobEnforced(self, cheapest, hoursNeeded, remainingSeconds, power):
+    '''Returns the cheapest start window [hour, last] of a job of at least one hour or None to run it now, idle nodes are free.
+    A window is chosen if it is 0.1% cheaper than the cheapest before.'''
+    windows = len(self.prices) - hoursNeeded - 1
+    w = numpy.arange(1, windows)
+    pLast = self.price[hoursNeeded + w + 1] * power * remainingSeconds / 1000 / 3600
+    pFirst = self.price[w - 1] * (remainingSeconds * power) / 1000 / 3600
+    last = (pFirst > pLast) | (w == 1)
+    tail = numpy.where(last, pLast, pFirst)
+
+    last = last.tolist()
+    for exact in (False, True):
+      costs = (self._runCosts(numpy.zeros(windows - 1), windows, hoursNeeded, power, exact) + tail).tolist()
+      config = None
+      best = cheapest
+      ambiguous = False
+      for i in range(len(costs)):
+        if self._close(costs[i], best * 0.999):
+          ambiguous = True
+        if costs[i] < best * 0.999:
+          best = costs[i]
+          config = [i + 1, last[i]]
+      if not ambiguous:
+        break
+    return config
@@ -0,0 +1,51 @@
+from bisect import bisect_left, insort
+
+class ReleaseProfile:
+  '''Availability profile of the nodes for EASY backfilling: the sorted release times of the nodes of the dispatched jobs.
+  The reservation of the first pending job, i.e., the release times and the cumulative number of released nodes up to its shadow time, is computed once and kept until the profile changes.
+  Checking if a backfilled job delays the first pending job is then O(log n).'''
+
+  def __init__(self):
+    self.releases = [] # sorted list of [time, nodes]
+    self.reservation = None # (nodes of the first job, release times, cumulative released nodes)
+
+  def __len__(self):
+    return len(self.releases)
+
+  def add(self, time, nodes):
+    insort(self.releases, [time, nodes])
+    self.reservation = None
+
+  def purge(self, time):
+    'The releases are dropped once the earliest of them lies after the given time'
+    if self.releases and self.releases[0][0] > time:
+      self.releases = []
+      self.reservation = None
+
+  def _reserve(self, nodesFirst):
+    if self.reservation is None or self.reservation[0] != nodesFirst:
+      times = []
+      released = []
+      nodes = 0
+      for (t, n) in self.releases:
+        nodes = nodes + n
+        times.append(t)
+        released.append(nodes)
+        if nodes >= nodesFirst:
+          break
+      self.reservation = (nodesFirst, times, released)
+    return self.reservation
+
+  def delays(self, time, job, freeNodes, nodesFirst):
+    '''True if starting the job now delays the first pending job that needs nodesFirst nodes.
+    freeNodes: the number of currently available nodes'''
+    if freeNodes - job.nodes >= nodesFirst: # the job fits together with the first job anyway
+      return False
+    (_, times, released) = self._reserve(nodesFirst)
+    # the shadow time: the first release after which the first job fits
+    pos = bisect_left(released, nodesFirst - freeNodes)
+    if pos == len(released): # the first job never fits
+      return False
+    if freeNodes + released[pos] - job.nodes >= nodesFirst: # the spare nodes at the shadow time suffice for both
+      return False
+    return times[pos] > time + job.durationMin
@@ -1,13 +1,69 @@
+import io
+import os
+import shutil
+
+from schedSim.powerTimeline import PowerTimeline
+from schedSim.snapshot import SnapshotFile
+
+def branchFileName(filename, branch):
+  'The name of the file of the branch of a forked simulation, the name of the branch is appended before the extension'
+  (root, ext) = os.path.splitext(filename)
+  return "%s-%s%s" % (root, branch, ext)
+
 class Reporter:
   'This class analyses the results of the simulation run'
 
   cluster = None
   energyCostModel = None
 
+  # the events of the simulation, they are dispatched to the methods of the same name
+  events = ("jobSubmitted", "jobFinished", "jobStarted", "clusterStatusChanged", "jobAbortedWithErrors", "emptyNodeFailed", "nodeRepaired")
+
+  def hook(self, event):
+    'The method to call for the event, None if the reporter ignores it'
+    if getattr(type(self), event) is getattr(Reporter, event):
+      return None
+    return getattr(self, event)
+
+  def __getstate__(self):
+    'Open files are stored by their position in a snapshot'
+    state = dict(self.__dict__)
+    for (k, v) in state.items():
+      if isinstance(v, io.IOBase) and not v.closed:
+        state[k] = SnapshotFile(v)
+    return state
+
+  def __setstate__(self, state):
+    for (k, v) in state.items():
+      if isinstance(v, SnapshotFile):
+        state[k] = v.reopen()
+    self.__dict__.update(state)
+
   def setCluster(self, cluster, eModel):
     self.energyCostModel = eModel
     self.cluster = cluster
 
+  def setEnergyModel(self, eModel):
+    'The energy model changes during the simulation, e.g., in a branch of a forked simulation'
+    self.energyCostModel = eModel
+
+  def _openFiles(self):
+    return [(k, v) for (k, v) in self.__dict__.items() if isinstance(v, io.IOBase) and not v.closed]
+
+  def flush(self):
+    for (k, f) in self._openFiles():
+      f.flush()
+
+  def branch(self, name):
+    '''The simulation is forked and this process continues the branch, the output continues in copies of the open files that are named with branchFileName().
+    The files must be flushed before the process is forked'''
+    for (k, f) in self._openFiles():
+      filename = branchFileName(f.name, name)
+      shutil.copyfile(f.name, filename)
+      mode = "ab" if "b" in f.mode else "a"
+      f.close()
+      setattr(self, k, open(filename, mode))
+
   def printSummary(self, starttime, time):
     pass
 
@@ -17,7 +73,7 @@ class Reporter:
   def jobFinished(self, time, job):
     pass
 
-  def jobStarted(self, time, job, partition):
+  def jobStarted(self, time, job, runtime, partition):
     pass
 
   def clusterStatusChanged(self, time):
@@ -45,6 +101,9 @@ class SilentReporter(Reporter):
   nodesRepaired = 0
   jobsAborted = 0
   lastTime = 0
+  # record the power consumption and compute the energy and its costs in printSummary
+  deferEnergy = False
+  powerTimeline = None
 
 
   def jobAbortedWithErrors(self, time, job):
@@ -63,6 +122,15 @@ class SilentReporter(Reporter):
     self.powerConsumption = 0 #cluster.infrastructurePowerConsumption
     self.energyCostModel = eModel
 
+  def setEnergyModel(self, eModel):
+    'The recorded power consumption is accounted with the previous model'
+    if self.powerTimeline is not None:
+      (energy, costs) = self.powerTimeline.integrate(self.energyCostModel)
+      self.energyConsumed += energy
+      self.costsEnergy += costs
+      self.powerTimeline = None
+    self.energyCostModel = eModel
+
   def jobSubmitted(self, time, job):
     if self.lastTime == 0:
       self.lastTime = time
@@ -79,15 +147,19 @@ class SilentReporter(Reporter):
 
   def clusterStatusChanged(self, time):
     if time != self.lastTime:
-      print(self.cluster.nodes)
       curpower = self.powerConsumption #+ self.cluster.nodePowerConsumption * self.cluster.nodes # idle nodes
       assert curpower >= 0
       assert time >= self.lastTime
-      ecosts = self.energyCostModel.energyCosts(self.lastTime, time, curpower)
-      #assert ecosts >= 0
-      #print([time, self.lastTime, self.cluster.nodes, ecosts])
-      self.costsEnergy += ecosts
-      self.energyConsumed += (time - self.lastTime) * curpower
+      if self.deferEnergy:
+        if self.powerTimeline is None:
+          self.powerTimeline = PowerTimeline(self.lastTime)
+        self.powerTimeline.append(time, curpower)
+      else:
+        ecosts = self.energyCostModel.energyCosts(self.lastTime, time, curpower)
+        #assert ecosts >= 0
+        #print([time, self.lastTime, self.cluster.nodes, ecosts])
+        self.costsEnergy += ecosts
+        self.energyConsumed += (time - self.lastTime) * curpower
 
       self.lastTime = time
 
@@ -113,6 +185,12 @@ class SilentReporter(Reporter):
     runtime = (endtime - starttime)
     utilization = float(self.nodeTime) / (runtime * c.nodes)
 
+    if self.powerTimeline is not None:
+      (energy, costs) = self.powerTimeline.integrate(self.energyCostModel)
+      self.energyConsumed += energy
+      self.costsEnergy += costs
+      self.powerTimeline = None
+
     self.costsEnergy += self.energyCostModel.fixedPenalties(self.powerConsumptionStats[0], self.powerConsumptionStats[1])
 
     s["runtime_days"] = runtime / 3600 / 24
@@ -0,0 +1,83 @@
+from schedSim.reporter import Reporter, SilentReporter
+
+class ReporterBus(Reporter):
+  '''Forward the events of the simulation to several sinks, thus, outputs are combined without inheritance.
+  A sink is a Reporter that subscribes to the events it handles, i.e., the methods it overrides, or to the given events.
+  The energy accounting is done once by a SilentReporter and shared with the sinks as their attribute accounting.
+  Events without subscribers are not dispatched at all.'''
+
+  def __init__(self, accounting = True):
+    self.sinks = []
+    self.subscribers = {event : [] for event in self.events}
+    self.accounting = None
+    if accounting:
+      self.accounting = self.attach(SilentReporter())
+
+  @property
+  def stats(self):
+    return self.accounting.stats
+
+  def attach(self, sink, events = None):
+    'Attach the sink for the events, by default for the events it handles, returns the sink'
+    if events is None:
+      events = [event for event in self.events if sink.hook(event) != None]
+    for event in events:
+      if event not in self.subscribers:
+        raise Exception("Unknown event: %s" % event)
+      self.subscribers[event].append(getattr(sink, event))
+      self._subscribe(event)
+    if self.accounting != None:
+      sink.accounting = self.accounting
+    self.sinks.append(sink)
+    return sink
+
+  def _subscribe(self, event):
+    'The event is forwarded directly to a single subscriber, the instance attribute replaces the method'
+    subscribers = tuple(self.subscribers[event])
+    if len(subscribers) == 1:
+      setattr(self, event, subscribers[0])
+      return
+    def dispatch(*args):
+      for subscriber in subscribers:
+        subscriber(*args)
+    setattr(self, event, dispatch)
+
+  def __getstate__(self):
+    'The dispatchers of the events are created again from the subscribers'
+    state = Reporter.__getstate__(self)
+    for event in self.events:
+      state.pop(event, None)
+    return state
+
+  def __setstate__(self, state):
+    Reporter.__setstate__(self, state)
+    for (event, subscribers) in self.subscribers.items():
+      if subscribers:
+        self._subscribe(event)
+
+  def hook(self, event):
+    if not self.subscribers[event]:
+      return None
+    return getattr(self, event)
+
+  def setCluster(self, cluster, eModel):
+    Reporter.setCluster(self, cluster, eModel)
+    for sink in self.sinks:
+      sink.setCluster(cluster, eModel)
+
+  def setEnergyModel(self, eModel):
+    Reporter.setEnergyModel(self, eModel)
+    for sink in self.sinks:
+      sink.setEnergyModel(eModel)
+
+  def flush(self):
+    for sink in self.sinks:
+      sink.flush()
+
+  def branch(self, name):
+    for sink in self.sinks:
+      sink.branch(name)
+
+  def printSummary(self, starttime, endtime):
+    for sink in self.sinks:
+      sink.printSummary(starttime, endtime)
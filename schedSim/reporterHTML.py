@@ -1,57 +1,227 @@
+import json
 import os
+import shutil
 import sys
 import re
 import time as Time
 from dateutil import parser as timeparser
 
-from schedSim.reporter import SilentReporter
+from schedSim.reporter import Reporter
+from schedSim.reporterBus import ReporterBus
 
-class ReporterHTML(SilentReporter):
+def openTemplate(filename, experimentName = "", tiles = ""):
+  '''Create the HTML file from vis/template.html, returns the file that is written up to the ITEMS marker and the rest of the template
+  tiles: the directory of the level of detail tiles relative to the HTML file'''
+  dire = os.path.dirname(__file__)
+  outdir = os.path.dirname(filename)
+  if outdir == "":
+    outdir = os.getcwd()
+
+  template = open(dire + "/vis/template.html", "r")
+  data = template.read()
+  template.close()
+
+  data = re.sub("\$\{EXPERIMENT_NAME\}", experimentName, data)
+  data = re.sub("\$\{TILES\}", tiles, data)
+  m = re.search("(.*)\$\{ITEMS\}(.*)", data, flags=re.DOTALL)
+  if not m:
+    print("Could not find ITEMS marker in template!")
+    sys.exit(1)
+
+  outfile = open(filename + ".html", "w")
+  outfile.write(m.group(1))
+
+  try:
+    os.symlink(dire + "/vis/vis.css", outdir + "/vis.css")
+    os.symlink(dire + "/vis/vis.js", outdir + "/vis.js")
+  except:
+    pass
+  return (outfile, m.group(2))
+
+class HTMLSink(Reporter):
+  'Write the executed jobs into an HTML timeline'
 
   outfile = None
   templateSuffix = None
 
   def __init__(self, filename, experimentName = ""):
-    dire = os.path.dirname(__file__)
-    outdir = os.path.dirname(filename)
-    if outdir == "":
-      outdir = os.getcwd()
-
-    template = open(dire + "/vis/template.html", "r")
-    data = template.read()
-    template.close()
-
-    data = re.sub("\$\{EXPERIMENT_NAME\}", experimentName, data)
-    m = re.search("(.*)\$\{ITEMS\}(.*)", data, flags=re.DOTALL)
-    if not m:
-      print("Could not find ITEMS marker in template!")
-      sys.exit(1)
-
-    self.outfile = open(filename + ".html", "w")
-    self.outfile.write(m.group(1))
-    self.templateSuffix = m.group(2)
-
-    try:
-      os.symlink(dire + "/vis/vis.css", outdir + "/vis.css")
-      os.symlink(dire + "/vis/vis.js", outdir + "/vis.js")
-    except:
-      pass
+    (self.outfile, self.templateSuffix) = openTemplate(filename, experimentName)
 
   def convertTime(self, time):
     return Time.strftime("%Y-%m-%d %H:%M:%S", Time.gmtime(time))
 
-  def jobSubmitted(self, time, job):
-    SilentReporter.jobSubmitted(self, time, job)
+  #def jobSubmitted(self, time, job):
     #self.outfile.write("{content:'(%d)',start:'%s',type:'point'}," % (job.jobid, self.convertTime(time)))
 
   def jobFinished(self, time, job):
-    SilentReporter.jobFinished(self, time, job)
-    self.outfile.write("{content:'%d on %d',start:'%s',end:'%s'}," % (job.jobid, job.nodes, self.convertTime(job.startTime), self.convertTime(time)))
-
-  def jobStarted(self, time, job, runtime, partition):
-    SilentReporter.jobStarted(self, time, job, runtime, partition)
+    self.outfile.write("{content:'%s on %d',start:'%s',end:'%s'}," % (job.jobid, job.nodes, self.convertTime(job.startTime), self.convertTime(time)))
 
   def printSummary(self, starttime, endtime):
-    SilentReporter.printSummary(self, starttime, endtime)
     self.outfile.write(self.templateSuffix)
     self.outfile.close()
+
+class ReporterHTML(ReporterBus):
+  'Write the executed jobs into an HTML timeline'
+
+  def __init__(self, filename, experimentName = ""):
+    super().__init__()
+    self.attach(HTMLSink(filename, experimentName))
+
+
+class TimelineSink(Reporter):
+  '''Write the executed jobs and the utilization of the nodes into level of detail tiles for an HTML timeline.
+  The jobs are written into tiles of jobTileSeconds, the utilization is averaged into bands of a minute, an hour and a day and every level into tiles of tileBands bands.
+  The tiles are appended to during the simulation, the timeline loads only the tiles of the visible window from the finest level that covers it with maxTiles tiles.'''
+
+  jobTileSeconds = 6 * 3600
+  bandSeconds = [60, 3600, 86400]
+  tileBands = 720
+  maxTiles = 4
+  # the number of buffered items, once reached all items are written
+  bufferItems = 10000
+
+  def __init__(self, filename, experimentName = ""):
+    self.levels = [("jobs", self.jobTileSeconds)] + [("%ds" % b, b * self.tileBands) for b in self.bandSeconds]
+    self.experimentName = experimentName
+    self._create(filename)
+    for (name, tileSeconds) in self.levels:
+      os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+
+    self.buffers = {} # (level, tile) -> items
+    self.buffered = 0
+    self.tiles = {name : set() for (name, tileSeconds) in self.levels}
+    self.items = 0
+    self.usedNodes = 0
+    self.startTime = None
+    self.lastTime = None
+    self.bands = None # per band level: [index of the current band, node seconds in the band, time up to which they are added]
+
+  def _create(self, filename):
+    'Write the HTML file of the timeline that loads the tiles'
+    self.filename = filename
+    self.directory = filename + "-timeline"
+    (outfile, suffix) = openTemplate(filename, self.experimentName, os.path.basename(self.directory))
+    outfile.write(suffix)
+    outfile.close()
+
+  def setCluster(self, cluster, eModel):
+    Reporter.setCluster(self, cluster, eModel)
+    self.nodes = cluster.nodes
+
+  def branch(self, name):
+    'The written tiles are copied for the branch'
+    directory = self.directory
+    self._create("%s-%s" % (self.filename, name))
+    shutil.copytree(directory, self.directory, dirs_exist_ok=True)
+
+  def __getstate__(self):
+    'A snapshot stores the sizes of the written tiles'
+    state = Reporter.__getstate__(self)
+    state["tileSizes"] = {(level, tile) : os.path.getsize(self._tileFile(level, tile)) for (level, tiles) in self.tiles.items() for tile in tiles if os.path.exists(self._tileFile(level, tile))}
+    return state
+
+  def __setstate__(self, state):
+    'The tiles are truncated to their sizes in the snapshot, tiles written later are removed'
+    sizes = state.pop("tileSizes")
+    Reporter.__setstate__(self, state)
+    for (name, tileSeconds) in self.levels:
+      for f in os.listdir(os.path.join(self.directory, name)):
+        tile = int(f[:-3])
+        if (name, tile) in sizes:
+          os.truncate(self._tileFile(name, tile), sizes[(name, tile)])
+        else:
+          os.remove(self._tileFile(name, tile))
+
+  def _tileFile(self, level, tile):
+    return os.path.join(self.directory, level, "%d.js" % tile)
+
+  def _add(self, level, tile, item):
+    key = (level, tile)
+    buf = self.buffers.get(key)
+    if buf == None:
+      buf = []
+      self.buffers[key] = buf
+      self.tiles[level].add(tile)
+    buf.append(item)
+    self.buffered = self.buffered + 1
+    if self.buffered >= self.bufferItems:
+      self._flush()
+
+  def _flush(self):
+    for ((level, tile), items) in self.buffers.items():
+      with open(self._tileFile(level, tile), "a") as f:
+        f.write("timelineTile(%s, %d, [%s]);\n" % (json.dumps(level), tile, ",".join(items)))
+    self.buffers = {}
+    self.buffered = 0
+
+  def _advance(self, time):
+    'Add the used nodes up to the time to the bands, completed bands are written'
+    if self.startTime == None:
+      self.startTime = time
+      self.bands = [[int(time // b), 0, time] for b in self.bandSeconds]
+    for (b, band) in zip(self.bandSeconds, self.bands):
+      if self.usedNodes == 0 and band[1] == 0:
+        # skip the empty bands
+        band[0] = max(band[0], int(time // b))
+        band[2] = time
+        continue
+      while (band[0] + 1) * b <= time:
+        end = (band[0] + 1) * b
+        band[1] += self.usedNodes * (end - max(band[2], band[0] * b))
+        self._band(b, band[0], band[1] / b)
+        band[0] = band[0] + 1
+        band[1] = 0
+        band[2] = end
+        if self.usedNodes == 0:
+          band[0] = int(time // b)
+          break
+      band[1] += self.usedNodes * (time - max(band[2], band[0] * b))
+      band[2] = time
+    self.lastTime = time
+
+  def _band(self, b, index, nodes):
+    if nodes == 0:
+      return
+    level = "%ds" % b
+    start = index * b
+    item = '{id:"%s-%d",start:%d,end:%d,type:"background",content:"%.1f nodes",className:"band%d"}' % (level, index, start * 1000, (start + b) * 1000, nodes, round(nodes * 10 / self.nodes))
+    self._add(level, start // (b * self.tileBands), item)
+
+  def _job(self, time, job):
+    self.items = self.items + 1
+    start = job.startTime
+    item = '{id:"j%d",content:%s,start:%d,end:%d}' % (self.items, json.dumps("%s on %d" % (job.jobid, job.nodes)), start * 1000, time * 1000)
+    for tile in range(int(start // self.jobTileSeconds), int(max(start, time - 1) // self.jobTileSeconds) + 1):
+      self._add("jobs", tile, item)
+
+  def jobStarted(self, time, job, runtime, partition):
+    self._advance(time)
+    self.usedNodes = self.usedNodes + job.nodes
+
+  def jobFinished(self, time, job):
+    self._advance(time)
+    self.usedNodes = self.usedNodes - job.nodes
+    self._job(time, job)
+
+  def jobAbortedWithErrors(self, time, job):
+    self._advance(time)
+    self.usedNodes = self.usedNodes - job.nodes
+    self._job(time, job)
+
+  def printSummary(self, starttime, endtime):
+    if self.startTime != None:
+      self._advance(endtime)
+      # the last bands are incomplete
+      for (b, band) in zip(self.bandSeconds, self.bands):
+        self._band(b, band[0], band[1] / b)
+    self._flush()
+    index = {"start" : (self.startTime or starttime) * 1000, "end" : endtime * 1000, "maxTiles" : self.maxTiles, "levels" : [{"name" : name, "tileSeconds" : tileSeconds, "tiles" : sorted(self.tiles[name])} for (name, tileSeconds) in self.levels]}
+    with open(os.path.join(self.directory, "index.js"), "w") as f:
+      f.write("timelineIndex(%s);\n" % json.dumps(index))
+
+class ReporterTimeline(ReporterBus):
+  'Write the executed jobs and the utilization into level of detail tiles of an HTML timeline'
+
+  def __init__(self, filename, experimentName = ""):
+    super().__init__()
+    self.attach(TimelineSink(filename, experimentName))
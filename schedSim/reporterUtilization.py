@@ -2,43 +2,52 @@ import os
 import sys
 import re
 import time as Time
+from array import array
 from dateutil import parser as timeparser
+import numpy
+import zlib
 
-from schedSim.reporter import SilentReporter
+from schedSim.reporter import Reporter
+from schedSim.reporterBus import ReporterBus
 
-class ReporterUtilization(SilentReporter):
-  'Write the system statistics into a CSV file'
+class UtilizationSink(Reporter):
+  '''Write the system statistics into a CSV file, the power consumption is taken from the accounting.
+  The accounting is the SilentReporter of the ReporterBus the sink is attached to or a SilentReporter given to the constructor that receives the events as well'''
 
   statFile = None
+  accounting = None
 
   # array of (time, pending jobs, running jobs, used nodes, broken nodes)
   status = (0,0,0,0,0)
 
   def emptyNodeFailed(self, time):
-    SilentReporter.emptyNodeFailed(self, time)
     p = self.status
     self.status = (time, p[1], p[2], p[3], p[4] + 1)
     self._write_entry("B", None)
 
   def jobAbortedWithErrors(self, time, job):
-    SilentReporter.jobAbortedWithErrors(self, time, job)
     p = self.status
     self.status = (time, p[1] + 1, p[2] - 1, p[3] - job.nodes, p[4] + 1)
     self._write_entry("b", job)
 
   def nodeRepaired(self, time):
-    SilentReporter.nodeRepaired(self, time)
     p = self.status
     self.status = (time, p[1], p[2], p[3], p[4] - 1)
     self._write_entry("r", None)
 
-  def __init__(self, filename):
+  def __init__(self, filename, accounting = None):
+    self.accounting = accounting
     self.statFile = open(filename + "-stats.csv", "w")
     self.statFile.write("Time,PendingJobs,RunningJobs,UsedNodes,BrokenNodes,Operation,WaitingTime,account,jobid,name,nodes,PPN,durationMin,clusterEnergyConsumption,clusterEnergyCosts\n")
 
+  def setCluster(self, cluster, eModel):
+    Reporter.setCluster(self, cluster, eModel)
+    if self.accounting == None:
+      raise Exception("%s needs an accounting reporter, attach it to a ReporterBus or give the accounting to the constructor" % type(self).__name__)
+
   def _write_entry(self, typ, job):
      if job  == None:
-       self.statFile.write("%d,%d,%d,%d,%s,%s,,,,,,,,%s\n" % (self.status[0],self.status[1],self.status[2], self.status[3],self.status[4], typ, self.powerConsumption))
+       self.statFile.write("%d,%d,%d,%d,%s,%s,,,,,,,,%s\n" % (self.status[0],self.status[1],self.status[2], self.status[3],self.status[4], typ, self.accounting.powerConsumption))
        return
 
      waitingTime = ""
@@ -48,27 +57,149 @@ class ReporterUtilization(SilentReporter):
         account = job.account
         if job.startTime < job.submissionTime:
           print("Error: negative waiting time" + str(waitingTime))
-     self.statFile.write("%d,%d,%d,%d,%s,%s,%s,%s,%s,%s,%s,%s,%s, %s\n" % (self.status[0],self.status[1],self.status[2], self.status[3],self.status[4], typ, waitingTime, account, job.jobid, job.name, job.nodes, job.PPN, job.durationMin, self.powerConsumption))
+     self.statFile.write("%d,%d,%d,%d,%s,%s,%s,%s,%s,%s,%s,%s,%s, %s\n" % (self.status[0],self.status[1],self.status[2], self.status[3],self.status[4], typ, waitingTime, account, job.jobid, job.name, job.nodes, job.PPN, job.durationMin, self.accounting.powerConsumption))
 
 
   def jobSubmitted(self, time, job):
-    SilentReporter.jobSubmitted(self, time, job)
     p = self.status
     self.status = (time, p[1] + 1, p[2], p[3], p[4])
     self._write_entry("C", job)
 
   def jobFinished(self, time, job):
-    SilentReporter.jobFinished(self, time, job)
     p = self.status
     self.status = (time, p[1], p[2] - 1, p[3] - job.nodes, p[4])
     self._write_entry("-", job)
 
   def jobStarted(self, time, job, runtime, partition):
-    SilentReporter.jobStarted(self, time, job, runtime, partition)
     p = self.status
     self.status = (time, p[1] - 1, p[2] + 1, p[3] + job.nodes, p[4])
     self._write_entry("+", job)
 
   def printSummary(self, starttime, endtime):
-    SilentReporter.printSummary(self, starttime, endtime)
     self.statFile.close()
+
+class ReporterUtilization(ReporterBus):
+  'Write the system statistics into a CSV file'
+
+  def __init__(self, filename):
+    super().__init__()
+    self.attach(UtilizationSink(filename))
+
+STATS_MAGIC = b"SSSTATS1"
+
+# the columns of the binary statistics with the type codes of their buffers
+# strings are stored as int32 ids into the table of strings, -1 encodes an empty field
+# the numbers of the job are 0 and WaitingTime is NaN if the field is empty
+STATS_COLUMNS = [("Time", "q"), ("PendingJobs", "i"), ("RunningJobs", "i"), ("UsedNodes", "i"), ("BrokenNodes", "i"), ("Operation", "b"), ("WaitingTime", "d"), ("account", "i"), ("jobid", "i"), ("name", "i"), ("nodes", "i"), ("PPN", "i"), ("durationMin", "q"), ("clusterEnergyConsumption", "d")]
+
+class BinaryUtilizationSink(UtilizationSink):
+  '''Write the system statistics of the UtilizationSink into a binary file with typed columns.
+  The rows are buffered and written in blocks, every block consists of the strings that are new in the block and one zlib compressed array per column in the NumPy format.
+  Use statisticsToCSV() to convert the file into the CSV file of the UtilizationSink.'''
+
+  # the number of rows of a block
+  blockRows = 65536
+  # the zlib compression level
+  compression = 1
+
+  def __init__(self, filename, accounting = None):
+    self.accounting = accounting
+    self.statFile = open(filename + "-stats.bin", "wb")
+    self.statFile.write(STATS_MAGIC)
+    self.strings = {}
+    self.newStrings = []
+    self.buffers = [array(t) for (c, t) in STATS_COLUMNS]
+
+  def _string(self, value):
+    value = str(value)
+    i = self.strings.get(value)
+    if i == None:
+      i = len(self.strings)
+      self.strings[value] = i
+      self.newStrings.append(value)
+    return i
+
+  def _write_entry(self, typ, job):
+    b = self.buffers
+    s = self.status
+    for i in range(5):
+      b[i].append(int(s[i]))
+    b[5].append(ord(typ))
+    if job == None:
+      b[6].append(numpy.nan)
+      for i in range(7, 10):
+        b[i].append(-1)
+      for i in range(10, 13):
+        b[i].append(0)
+    else:
+      if typ == "+":
+        b[6].append(job.startTime - job.submissionTime)
+        b[7].append(self._string(job.account))
+        if job.startTime < job.submissionTime:
+          print("Error: negative waiting time" + str(job.startTime - job.submissionTime))
+      else:
+        b[6].append(numpy.nan)
+        b[7].append(-1)
+      b[8].append(self._string(job.jobid))
+      b[9].append(self._string(job.name))
+      b[10].append(job.nodes)
+      b[11].append(job.PPN)
+      b[12].append(job.durationMin)
+    b[13].append(self.accounting.powerConsumption)
+    if len(b[0]) >= self.blockRows:
+      self._flush()
+
+  def _flush(self):
+    if len(self.buffers[0]) == 0:
+      return
+    numpy.save(self.statFile, numpy.array([v.encode("utf-8") for v in self.newStrings], dtype=bytes), allow_pickle=False)
+    for buf in self.buffers:
+      numpy.save(self.statFile, numpy.frombuffer(zlib.compress(buf, self.compression), dtype=numpy.uint8), allow_pickle=False)
+    self.newStrings = []
+    self.buffers = [array(t) for (c, t) in STATS_COLUMNS]
+
+  def printSummary(self, starttime, endtime):
+    self._flush()
+    self.statFile.close()
+
+class ReporterUtilizationBinary(ReporterBus):
+  'Write the system statistics into a binary file'
+
+  def __init__(self, filename):
+    super().__init__()
+    self.attach(BinaryUtilizationSink(filename))
+
+def readStatistics(filename):
+  'Read the binary statistics, returns the dictionary of the columns and the table of strings'
+  strings = []
+  parts = {c : [] for (c, t) in STATS_COLUMNS}
+  with open(filename, "rb") as f:
+    if f.read(len(STATS_MAGIC)) != STATS_MAGIC:
+      raise Exception("%s is not a binary statistics file" % filename)
+    size = os.fstat(f.fileno()).st_size
+    while f.tell() < size:
+      strings.extend(v.decode("utf-8") for v in numpy.load(f, allow_pickle=False).tolist())
+      for (c, t) in STATS_COLUMNS:
+        parts[c].append(numpy.frombuffer(zlib.decompress(numpy.load(f, allow_pickle=False)), dtype=t))
+  columns = {c : numpy.concatenate(parts[c]) if parts[c] else numpy.zeros(0, dtype=t) for (c, t) in STATS_COLUMNS}
+  return (columns, strings)
+
+def _number(value):
+  if value == int(value):
+    return "%d" % value
+  return repr(value)
+
+def statisticsToCSV(filename, csvFilename):
+  '''Convert the binary statistics into the CSV file of the UtilizationSink.
+  Numbers are written as integers if they have no fraction, thus, floating point numbers such as 1.0 are written as 1.'''
+  (columns, strings) = readStatistics(filename)
+  strings.append("") # the id -1
+  rows = zip(*[columns[c].tolist() for (c, t) in STATS_COLUMNS])
+  with open(csvFilename, "w") as out:
+    out.write("Time,PendingJobs,RunningJobs,UsedNodes,BrokenNodes,Operation,WaitingTime,account,jobid,name,nodes,PPN,durationMin,clusterEnergyConsumption,clusterEnergyCosts\n")
+    for (time, pending, running, used, broken, typ, waitingTime, account, jobid, name, nodes, PPN, durationMin, power) in rows:
+      if jobid == -1:
+        out.write("%d,%d,%d,%d,%s,%s,,,,,,,,%s\n" % (time, pending, running, used, broken, chr(typ), _number(power)))
+        continue
+      waitingTime = "" if waitingTime != waitingTime else _number(waitingTime)
+      out.write("%d,%d,%d,%d,%s,%s,%s,%s,%s,%s,%s,%s,%s, %s\n" % (time, pending, running, used, broken, chr(typ), waitingTime, strings[account], strings[jobid], strings[name], nodes, PPN, durationMin, _number(power)))
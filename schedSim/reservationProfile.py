@@ -0,0 +1,128 @@
+from collections import deque
+
+class ReservationProfile:
+  '''Node usage over time of the running and the reserved jobs, used for conservative backfilling.
+  The usage is kept in a sparse segment tree over the integer seconds [base, base + 2^SPAN_BITS) with lazy range additions.
+  Every node stores the addition to its range and the maximum and minimum usage below it, the children are created when a range is split.
+  Thus, reserving an interval is O(SPAN_BITS) and finding the earliest fit of a job visits only the nodes at the borders of the free ranges before it.
+  The search starts at the earliest fit of a recent query for a job that is not bigger, thus, it skips the queue reserved before.'''
+
+  SPAN_BITS = 31
+  HINTS = 256
+
+  def __init__(self, base):
+    self.base = int(base)
+    self.end = self.base + (1 << self.SPAN_BITS)
+    # node 0 is the absent child with zero usage, node 1 is the root
+    self.left = [0, 0]
+    self.right = [0, 0]
+    self.added = [0, 0]
+    self.max = [0, 0]
+    self.min = [0, 0]
+    # (start, limit of used nodes, duration, earliest fit) of the last queries
+    # as long as the usage only grows, a job with a later start, a lower limit and a longer duration cannot fit earlier
+    self.hints = deque(maxlen = self.HINTS)
+
+  def __len__(self):
+    'Number of nodes of the tree'
+    return len(self.max) - 1
+
+  def _newNode(self):
+    self.left.append(0)
+    self.right.append(0)
+    self.added.append(0)
+    self.max.append(0)
+    self.min.append(0)
+    return len(self.max) - 1
+
+  def _add(self, node, lo, hi, l, r, nodes):
+    if l <= lo and hi <= r:
+      self.added[node] += nodes
+      self.max[node] += nodes
+      self.min[node] += nodes
+      return
+    mid = (lo + hi) >> 1
+    if l < mid:
+      if not self.left[node]:
+        self.left[node] = self._newNode()
+      self._add(self.left[node], lo, mid, l, r, nodes)
+    if r > mid:
+      if not self.right[node]:
+        self.right[node] = self._newNode()
+      self._add(self.right[node], mid, hi, l, r, nodes)
+    a = self.left[node]
+    b = self.right[node]
+    self.max[node] = self.added[node] + max(self.max[a], self.max[b])
+    self.min[node] = self.added[node] + min(self.min[a], self.min[b])
+
+  def add(self, start, end, nodes):
+    'Add the nodes to the usage in [start, end), a negative number releases them'
+    start = max(int(start), self.base)
+    end = min(int(end), self.end)
+    if start >= end:
+      return
+    if nodes < 0:
+      self.hints.clear()
+    self._add(1, self.base, self.end, start, end, nodes)
+
+  def maxUsage(self, start, end = None):
+    'The maximum usage in [start, end), by default from start on'
+    start = max(int(start), self.base)
+    end = self.end if end is None else min(int(end), self.end)
+    if start >= end:
+      return 0
+    return self._maxUsage(1, self.base, self.end, start, end)
+
+  def _maxUsage(self, node, lo, hi, start, end):
+    if node == 0 or (start <= lo and hi <= end):
+      return self.max[node]
+    mid = (lo + hi) >> 1
+    used = None
+    if start < mid:
+      used = self._maxUsage(self.left[node], lo, mid, start, end)
+    if end > mid:
+      right = self._maxUsage(self.right[node], mid, hi, start, end)
+      used = right if used is None else max(used, right)
+    return self.added[node] + used
+
+  def earliestFit(self, start, duration, nodes, capacity):
+    'The first second from start on at which the nodes are free for the duration, or None if they never are'
+    limit = capacity - nodes
+    if limit < 0:
+      return None
+    start = max(int(start), self.base)
+    duration = max(int(duration), 1)
+    fit = start
+    for (s, l, d, f) in self.hints:
+      if f > fit and s <= start and l >= limit and d <= duration:
+        fit = f
+    fit = self._earliestFit(fit, duration, limit)
+    if fit is not None:
+      self.hints.append((start, limit, duration, fit))
+    return fit
+
+  def _earliestFit(self, start, duration, limit):
+    'The tree is traversed once in order, subtrees that are completely free or used are not visited'
+    added = self.added
+    maxUsed = self.max
+    minUsed = self.min
+    run = None # the start of the current range of free seconds
+    stack = [(1, self.base, self.end, 0)]
+    while stack:
+      (node, lo, hi, acc) = stack.pop()
+      if hi <= start:
+        continue
+      if acc + maxUsed[node] <= limit:
+        if run is None:
+          run = max(lo, start)
+        if hi - run >= duration:
+          return run
+        continue
+      if node == 0 or hi - lo == 1 or acc + minUsed[node] > limit: # the usage is acc or above the limit in the whole range
+        run = None
+        continue
+      acc = acc + added[node]
+      mid = (lo + hi) >> 1
+      stack.append((self.right[node], mid, hi, acc))
+      stack.append((self.left[node], lo, mid, acc))
+    return None
@@ -1,8 +1,14 @@
+from schedSim.nodeAllocator import NodeSet, FREE
+from schedSim.pendingQueue import PendingQueue, IndexedPendingQueue
+from schedSim.releaseProfile import ReleaseProfile
+
 class Scheduler:
   'This class represents the job scheduler'
 
   cluster = None
   energyModel = None
+  # the free nodes that the scheduler put to sleep, they are not counted in cluster.nodes
+  sleepingNodes = 0
 
   def setCluster(self, cluster, energyModel):
     self.cluster = cluster
@@ -15,8 +21,9 @@ class Scheduler:
   def newPendingJobs(self, jobs, time):
     'Indicate that several new job was submitted, this should trigger re-computation of the schedule'
 
-  def tryToSchedule(self, time, jobCompleted):
-    'Return a list of triples: Job, Duration, Partition (where to run) and update the runningJobList'
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
+    '''Return a list of triples: Job, Duration, Partition (where to run) and update the runningJobList
+    If the simulator allocates the nodes, freeNodeSet is the NodeSet of the free and sleeping nodes, a job may be placed on some of them by setting job.nodeSet'''
     return [] # (None, None, None)
 
   def jobCompleted(self, job, time):
@@ -25,36 +32,79 @@ class Scheduler:
   def jobAbortedWithErrors(self, job, time):
     'The jobs is stopped with a failure '
 
+  def wakeUp(self):
+    'Wake up the sleeping nodes virtually, they are counted in cluster.nodes again'
+    self.cluster.nodes += self.sleepingNodes
+    self.sleepingNodes = 0
+
+  def sleep(self, count, schedList, freeNodeSet):
+    '''Put count free nodes to sleep, the other free nodes run the jobs of schedList.
+    If freeNodeSet is given, the jobs are placed on the nodes that are awake first and the remaining nodes of the set are put to sleep'''
+    self.sleepingNodes += count
+    self.cluster.nodes -= count
+    if freeNodeSet == None:
+      return
+    awake = freeNodeSet.mask & self.cluster.allocator.states[FREE]
+    asleep = freeNodeSet.mask ^ awake
+    for (job, runtime, options) in schedList:
+      if job.dummy:
+        continue
+      nodeSet = NodeSet(awake).first(job.nodes)
+      nodeSet.mask |= NodeSet(asleep).first(job.nodes - len(nodeSet)).mask
+      awake ^= awake & nodeSet.mask
+      asleep ^= asleep & nodeSet.mask
+      job.nodeSet = nodeSet
+    self.cluster.allocator.sleep(NodeSet(awake))
+
   def pickJobOptionsForSchedule(self, job, schedList):
     schedList.append((job, job.durationMin, {"cpu_pstate": 4}));
 
   def submitAllJobsWithStartTime(self, jobs, time):
     pass
 
+  def pendingJobs(self):
+    'The pending jobs in the order they are scheduled'
+    return []
+
+  def takeOver(self, previous, runningJobs, time):
+    '''Continue the schedule of the previous scheduler from the time on, setCluster() is called before.
+    runningJobs are the jobs the previous scheduler started that are still running'''
+    self.cluster.nodes = self.cluster.nodes + previous.sleepingNodes
+    previous.sleepingNodes = 0
+    self.newPendingJobs(previous.pendingJobs(), time)
+
 class FIFOScheduler(Scheduler):
 
-  pendingList = []
+  # the PendingQueue of the simulation, scans may remove jobs in O(1)
+  pendingList = None
+
+  def setCluster(self, cluster, energyModel):
+    super().setCluster(cluster, energyModel)
+    self.pendingList = PendingQueue()
 
   def newPendingJobs(self, jobs, time):
     self.pendingList.extend(jobs)
 
+  def pendingJobs(self):
+    return list(self.pendingList)
+
   def jobAbortedWithErrors(self, job, time):
     # Add the job again on front of the list, i.e., it will re-run
-    self.pendingList.insert(0, job)
+    self.pendingList.appendleft(job)
 
-  def tryToSchedule(self, time, jobCompleted):
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
     if not self.pendingList:
       return []
     # Now try to retrieve as many jobs from the list as fit.
     schedList = []
     freeNodes = self.cluster.nodes
     while(self.pendingList):
-      job = self.pendingList[0]
+      job = self.pendingList.first()
 
       if freeNodes < job.nodes:
         return schedList
       freeNodes = freeNodes - job.nodes
-      self.pendingList.pop(0)
+      self.pendingList.popleft()
       self.pickJobOptionsForSchedule(job, schedList)
     return schedList
 
@@ -63,7 +113,11 @@ class FIFOBackfillDelayScheduler(FIFOScheduler):
   'Try to backfill from the first N jobs but ignore if an already pending job is delayed'
   backfillLength = 1000
 
-  def tryToSchedule(self, time, jobCompleted):
+  def setCluster(self, cluster, energyModel):
+    super().setCluster(cluster, energyModel)
+    self.pendingList = IndexedPendingQueue()
+
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
     if not self.pendingList:
       return []
 
@@ -71,22 +125,16 @@ class FIFOBackfillDelayScheduler(FIFOScheduler):
     schedList = []
     freeNodes = self.cluster.nodes
     i = 0
-    while( i < len(self.pendingList) ):
-      job = self.pendingList[i]
-      if freeNodes == 0:
+    pos = None
+    while freeNodes > 0 and self.pendingList and freeNodes >= self.pendingList.minNodes():
+      # now we backfill, the jobs that do not fit are skipped
+      (skipped, pos, job) = self.pendingList.nextFitting(pos, freeNodes)
+      i = i + skipped
+      if i > self.backfillLength or job is None:
         return schedList
 
-      #print("%d %d %d" % (i, time, job.nodes))
-
-      if freeNodes < job.nodes:
-        # now we backfill
-        i = i + 1
-        if i > self.backfillLength:
-          return schedList
-        continue
-
       freeNodes = freeNodes - job.nodes
-      self.pendingList.pop(i)
+      self.pendingList.remove(pos)
       self.pickJobOptionsForSchedule(job, schedList)
     return schedList
 
@@ -144,7 +192,7 @@ class FIFOBackfillTest(Scheduler):
     def jobAbortedWithErrors(self, job, time):
       pass
 
-    def tryToSchedule(self, time, jobCompleted):
+    def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
       # Try to retrieve as many jobs from the list as fit from the biggest size
       schedList = []
       freeNodes = self.cluster.nodes
@@ -160,47 +208,38 @@ class FIFOBackfillScheduler(FIFOScheduler):
   'Try to backfill from the first N jobs'
   backfillLength = 1000
 
-  # currently dispatched jobs
-  dispatchedJobs = []
+  # release times of the nodes of the dispatched jobs
+  dispatchedJobs = None
+
+  def setCluster(self, cluster, energyModel):
+    super().setCluster(cluster, energyModel)
+    self.pendingList = IndexedPendingQueue()
+    self.dispatchedJobs = ReleaseProfile()
+
+  def takeOver(self, previous, runningJobs, time):
+    super().takeOver(previous, runningJobs, time)
+    if isinstance(previous, FIFOBackfillScheduler):
+      # the release profile also contains the jobs that are not purged yet
+      self.dispatchedJobs = previous.dispatchedJobs
+      return
+    for job in runningJobs:
+      self.dispatchedJobs.add(job.startTime + job.durationMin, job.nodes)
 
   def purgeExpiredJobs(self, time):
-    while(self.dispatchedJobs):
-      if self.dispatchedJobs[0][0] > time:
-        self.dispatchedJobs.pop(0)
-      else:
-        return
+    self.dispatchedJobs.purge(time)
 
   def delaysExecutionOfPriorJob(self, time, job, freeNodes):
     # check if the job would delay the highest prior job
     # freeNodes: the number of currently available nodes
     if not self.pendingList:
       return False
-    nodesHighest = self.pendingList[0].nodes
-
-    nodeJobs = job.nodes
-    if freeNodes - nodeJobs >= nodesHighest: # the job fits together with the highest prior job anyway
-      return False
-
-    # now check when the highest priority job would start
-    dispatchTime = 0
-    for j in self.dispatchedJobs:
-      freeNodes += j[1]
-      if freeNodes >= nodesHighest:
-        dispatchTime = j[0]
-        break
-
-    if freeNodes - nodeJobs >= nodesHighest: # the job fits together with the highest prior job anyway
-      return False
-
-    # check if the job ends after dispatchTime
-    #print([time + job.durationMin, dispatchTime, freeNodes, nodesHighest])
-    return dispatchTime > time + job.durationMin
+    return self.dispatchedJobs.delays(time, job, freeNodes, self.pendingList.first().nodes)
 
   def dispatchJobs(self, time, schedList):
     for job, runtime, _ in schedList:
-      heappush(self.dispatchedJobs, [runtime + time, job.nodes])
+      self.dispatchedJobs.add(runtime + time, job.nodes)
 
-  def tryToSchedule(self, time, jobCompleted):
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
     if not self.pendingList:
       return []
 
@@ -209,31 +248,31 @@ class FIFOBackfillScheduler(FIFOScheduler):
     freeNodes = self.cluster.nodes
     i = 0
 
-    self.dispatchedJobs.sort() # sort the list
     self.purgeExpiredJobs(time)
 
-    while( i < len( self.pendingList) ):
-      job = self.pendingList[i]
-      if freeNodes == 0:
-        return schedList
-
-      #print("%d %d %d" % (i, time, job.nodes))
+    pos = None
+    while freeNodes > 0 and self.pendingList and freeNodes >= self.pendingList.minNodes():
+      (skipped, pos, job) = self.pendingList.nextFitting(pos, freeNodes)
+      i = i + skipped
+      if i > self.backfillLength or job is None:
+        # backfill length too big or no job fits
+        break
 
-      if job.nodes > freeNodes or (i != 0 and self.delaysExecutionOfPriorJob(time, job, freeNodes)):
+      if i != 0 and self.delaysExecutionOfPriorJob(time, job, freeNodes):
         i = i + 1
         if i > self.backfillLength:
-          # backfill length too big
-          self.dispatchJobs(time, schedList)
-          return schedList
+          break
         continue
 
       freeNodes -= job.nodes
-      self.pendingList.pop(i)
+      self.pendingList.remove(pos)
       self.pickJobOptionsForSchedule(job, schedList)
+      if freeNodes == 0 and self.pendingList.jobsAfter(pos):
+        return schedList
     self.dispatchJobs(time, schedList)
     return schedList
 
-from schedSim.schedulerAdvanced import BiggestFirstBackfillScheduler, LongestFirstBackfillScheduler
+from schedSim.schedulerAdvanced import BiggestFirstBackfillScheduler, LongestFirstBackfillScheduler, ConservativeBackfillScheduler
 from schedSim.schedulerEE import FIFOBackfillShutdownScheduler, FIFOPriceAwareShutdownScheduler, PriceAwareShutdownScheduler, EnforcePriceAwareShutdownScheduler, FIFOBackfillShutdownDelayScheduler
 
 class SchedulerFactory():
@@ -252,6 +291,8 @@ class SchedulerFactory():
       return BiggestFirstBackfillScheduler()
     if name == "LongestFirstBackfill":
       return LongestFirstBackfillScheduler()
+    if name == "ConservativeBackfill":
+      return ConservativeBackfillScheduler()
     if name == "FIFOBackfillShutdown":
       return FIFOBackfillShutdownScheduler()
     if name == "FIFOBackfillShutdownDelay":
@@ -261,5 +302,5 @@ class SchedulerFactory():
     if name == "EnforcePriceAwareShutdown":
       return EnforcePriceAwareShutdownScheduler(argument)
     if name == "list":
-      print(["FIFO" , "FIFOBackfill", "FIFOBackfillDeadline", "FIFOBackfillShutdown" , "BiggestFirstBackfill" , "LongestFirstBackfill", "FIFOPriceAwareShutdown", "PriceAwareShutdown", "EnforcePriceAwareShutdown"])
+      print(["FIFO" , "FIFOBackfill", "FIFOBackfillDeadline", "FIFOBackfillShutdown" , "BiggestFirstBackfill" , "LongestFirstBackfill", "ConservativeBackfill", "FIFOPriceAwareShutdown", "PriceAwareShutdown", "EnforcePriceAwareShutdown"])
     raise Exception("No valid model defined!")
@@ -1,26 +1,54 @@
+from schedSim.jobs import Job
+from schedSim.reservationProfile import ReservationProfile
 from schedSim.scheduler import Scheduler
 
+from bisect import bisect_left
 from heapq import heappop, heappush, nsmallest
 
 
 class BiggestFirstBackfillScheduler(Scheduler):
   '''This scheduler always schedules the biggest job (with the longest runtime first).
      If this job does not fit the current available nodes, it will wait until the allocation finish.
-     Includes back-filling (but the list is sorted by size to optimize usage.)'''
+     Includes back-filling (but the list is sorted by size to optimize usage.)
+     The pendingList is kept sorted, new jobs are inserted with bisect, jobs of the same priority are ordered by their submission.'''
 
   backfillLength = 100
-  pendingList = []
+  pendingList = None
+  pendingKeys = None # the sort keys of the pendingList
+
+  def setCluster(self, cluster, energyModel):
+    super().setCluster(cluster, energyModel)
+    self.pendingList = []
+    self.pendingKeys = []
+    self.submitted = 0
+
+  def priority(self, job):
+    'Jobs with the lowest priority value are scheduled first'
+    return (-job.nodes, -job.durationMin)
+
+  def addPendingJob(self, job):
+    self.submitted = self.submitted + 1
+    key = self.priority(job) + (self.submitted,)
+    pos = bisect_left(self.pendingKeys, key)
+    self.pendingKeys.insert(pos, key)
+    self.pendingList.insert(pos, job)
 
   def newPendingJobs(self, jobs, time):
-    self.pendingList.extend(jobs)
-    self.pendingList.sort(key=lambda x: (x.nodes, x.durationMin), reverse=True )
+    for job in jobs:
+      self.addPendingJob(job)
 
   def jobAbortedWithErrors(self, job, time):
-    # Add the job again on front of the list, i.e., it will re-run
-    self.pendingList.append(job)
-    self.pendingList.sort(key=lambda x: (x.nodes, x.durationMin), reverse=True )
+    # Add the job again, it is scheduled after the pending jobs of the same priority
+    self.addPendingJob(job)
 
-  def tryToSchedule(self, time, jobCompleted):
+  def pendingJobs(self):
+    return list(self.pendingList)
+
+  def nextFitting(self, i, freeNodes):
+    'The index of the first job from i on that fits on the free nodes, the pendingList is ordered by descending nodes'
+    return bisect_left(self.pendingKeys, (-freeNodes,), i)
+
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
    if not self.pendingList:
      return []
 
@@ -28,22 +56,16 @@ class BiggestFirstBackfillScheduler(Scheduler):
    schedList = []
    freeNodes = self.cluster.nodes
    i = 0
-   while( i < len(self.pendingList) ):
-     job = self.pendingList[i]
-     if freeNodes == 0:
+   while freeNodes > 0:
+     # now we backfill, the jobs that do not fit are skipped
+     i = self.nextFitting(i, freeNodes)
+     if i > self.backfillLength or i >= len(self.pendingList):
        return schedList
 
-     #print("%d %d %d" % (i, time, job.nodes))
-
-     if freeNodes < job.nodes:
-       # now we backfill
-       i = i + 1
-       if i > self.backfillLength:
-         return schedList
-       continue
-
+     job = self.pendingList[i]
      freeNodes = freeNodes - job.nodes
      self.pendingList.pop(i)
+     self.pendingKeys.pop(i)
      self.pickJobOptionsForSchedule(job, schedList)
    return schedList
 
@@ -53,11 +75,208 @@ class BiggestFirstBackfillScheduler(Scheduler):
 class LongestFirstBackfillScheduler(BiggestFirstBackfillScheduler):
   ''''''
 
+  def priority(self, job):
+    return (-job.durationMin, -job.nodes)
+
+  def nextFitting(self, i, freeNodes):
+    while i <= self.backfillLength and i < len(self.pendingList) and self.pendingList[i].nodes > freeNodes:
+      i = i + 1
+    return i
+
+
+class ConservativeBackfillScheduler(Scheduler):
+  '''Conservative backfilling: every pending job gets a reservation at the earliest time it fits without delaying the reservations of the jobs submitted before it.
+     A job is started when its reservation is reached, the reservations are kept in a ReservationProfile.
+     The schedule is changed incrementally:
+     If a job ends before its reserved time or nodes are repaired, the reservations are compressed: they are moved earlier in the order of the queue until one cannot move.
+     If nodes fail, the reservations of the last jobs of the queue are removed until the others fit and reserved again.
+     An aborted job is queued in front of all jobs and reserved after the compression.
+     If a reservation does not start at the end of a running job, the scheduler is woken up at its start.'''
+
+  def setCluster(self, cluster, energyModel):
+    super().setCluster(cluster, energyModel)
+    self.profile = None
+    self.queue = {} # pending job -> (sequence, reserved start or None if it does not fit)
+    self.order = [] # sorted list of (sequence, job) of the pending jobs
+    self.unreserved = set() # pending jobs that need more nodes than available
+    self.starts = [] # heap of (reserved start, sequence, number of the reservation, job), entries of moved reservations are skipped
+    self.reservations = 0
+    self.newJobs = []
+    self.running = {} # running job -> reserved end
+    self.runningEnds = {} # reserved end -> number of running jobs
+    self.runningNodes = 0
+    self.capacity = None
+    self.sequence = 0
+    self.front = 0 # aborted jobs are queued in front of all jobs
+    self.compress = False
+    self.wakeup = None
+
   def newPendingJobs(self, jobs, time):
-    self.pendingList.extend(jobs)
-    self.pendingList.sort(key=lambda x: (x.durationMin, x.nodes), reverse=True )
+    for job in jobs:
+      self.sequence = self.sequence + 1
+      self.queue[job] = (self.sequence, None)
+      self.order.append((self.sequence, job))
+      self.newJobs.append(job)
+
+  def pendingJobs(self):
+    return [job for (sequence, job) in self.order]
+
+  def takeOver(self, previous, runningJobs, time):
+    super().takeOver(previous, runningJobs, time)
+    for job in runningJobs:
+      self.startJob(job, job.startTime + self.reservedDuration(job))
+
+  def jobCompleted(self, job, time):
+    if self.releaseJob(job, time):
+      self.compress = True
 
   def jobAbortedWithErrors(self, job, time):
+    self.releaseJob(job, time)
     # Add the job again on front of the list, i.e., it will re-run
-    self.pendingList.append(job)
-    self.pendingList.sort(key=lambda x: (x.durationMin, x.nodes), reverse=True )
+    self.front = self.front - 1
+    self.queue[job] = (self.front, None)
+    self.order.insert(0, (self.front, job))
+    self.newJobs.append(job)
+    self.compress = True
+
+  def startJob(self, job, end):
+    self.running[job] = end
+    self.runningEnds[end] = self.runningEnds.get(end, 0) + 1
+    self.runningNodes = self.runningNodes + job.nodes
+
+  def releaseJob(self, job, time):
+    'Release the reservation of the job from the time on, returns True if the job ended before its reservation, e.g., a job without runtime reserves a second'
+    end = self.running.pop(job)
+    if self.runningEnds[end] == 1:
+      del self.runningEnds[end]
+    else:
+      self.runningEnds[end] -= 1
+    self.runningNodes = self.runningNodes - job.nodes
+    if time < end:
+      self.profile.add(time, end, -job.nodes)
+      return True
+    return False
+
+  def reservedDuration(self, job):
+    return max(int(job.durationMin), 1)
+
+  def reserve(self, job, time):
+    (sequence, _) = self.queue[job]
+    start = self.profile.earliestFit(time, self.reservedDuration(job), job.nodes, self.capacity)
+    self.queue[job] = (sequence, start)
+    if start is None:
+      self.unreserved.add(job)
+      return
+    self.unreserved.discard(job)
+    self.profile.add(start, start + self.reservedDuration(job), job.nodes)
+    self.reservations = self.reservations + 1
+    heappush(self.starts, (start, sequence, self.reservations, job))
+
+  def firstStart(self):
+    'The earliest reserved start or None, the heap entries of moved reservations are removed'
+    starts = self.starts
+    while starts:
+      (start, sequence, n, job) = starts[0]
+      entry = self.queue.get(job)
+      if entry is not None and entry[1] == start:
+        return start
+      heappop(starts)
+    return None
+
+  def reserveAll(self, time):
+    'Reserve all pending jobs again in a new profile'
+    self.profile = ReservationProfile(time)
+    for (job, end) in self.running.items():
+      self.profile.add(time, end, job.nodes)
+    self.starts = []
+    self.unreserved = set()
+    for (sequence, job) in self.order:
+      self.reserve(job, time)
+    self.compress = False
+
+  def compressReservations(self, time):
+    'Move the reservations earlier in the order of the queue, stop at the first one that cannot move'
+    for (sequence, job) in self.order:
+      start = self.queue[job][1]
+      if start is None or start <= time:
+        continue
+      duration = self.reservedDuration(job)
+      self.profile.add(start, start + duration, -job.nodes)
+      fit = self.profile.earliestFit(time, duration, job.nodes, self.capacity)
+      self.profile.add(fit, fit + duration, job.nodes)
+      if fit == start:
+        break
+      self.queue[job] = (sequence, fit)
+      self.reservations = self.reservations + 1
+      heappush(self.starts, (fit, sequence, self.reservations, job))
+    self.compress = False
+
+  def evictReservations(self, time):
+    '''The capacity shrank, remove the reservations of the last jobs of the queue until the others fit and reserve them again in order.
+    Only reservations that overlap a time the capacity is exceeded are removed'''
+    evicted = []
+    for (sequence, job) in reversed(self.order):
+      if self.profile.maxUsage(time) <= self.capacity:
+        break
+      start = self.queue[job][1]
+      if start is None:
+        continue
+      end = start + self.reservedDuration(job)
+      if self.profile.maxUsage(start, end) <= self.capacity:
+        continue
+      self.profile.add(start, end, -job.nodes)
+      self.queue[job] = (sequence, None)
+      evicted.append(job)
+    for job in reversed(evicted):
+      self.reserve(job, time)
+
+  def collectGarbage(self, time):
+    'The profile keeps the nodes of the past, copy the current reservations into a new profile once it grew too big'
+    if len(self.profile) < 64 * (len(self.queue) + len(self.running)) + 65536:
+      return
+    profile = ReservationProfile(time)
+    for (job, end) in self.running.items():
+      profile.add(time, end, job.nodes)
+    for (job, (_, start)) in self.queue.items():
+      if start is not None:
+        profile.add(start, start + self.reservedDuration(job), job.nodes)
+    self.profile = profile
+
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
+    capacity = self.cluster.nodes + self.runningNodes
+    first = self.firstStart()
+    if self.profile is None or (first is not None and first < time):
+      self.capacity = capacity
+      self.reserveAll(time)
+    else:
+      if capacity < self.capacity:
+        self.capacity = capacity
+        self.evictReservations(time)
+      elif capacity > self.capacity:
+        self.capacity = capacity
+        self.compress = True
+        for job in sorted(self.unreserved, key = lambda j: self.queue[j][0]):
+          self.reserve(job, time)
+      if self.compress:
+        self.compressReservations(time)
+      for job in sorted(self.newJobs, key = lambda j: self.queue[j][0]):
+        self.reserve(job, time)
+    self.newJobs = []
+
+    schedList = []
+    while True:
+      first = self.firstStart()
+      if first is None or first > time:
+        break
+      (start, sequence, n, job) = heappop(self.starts)
+      del self.queue[job]
+      del self.order[bisect_left(self.order, (sequence,))]
+      self.startJob(job, start + self.reservedDuration(job))
+      self.pickJobOptionsForSchedule(job, schedList)
+    self.collectGarbage(time)
+
+    if first is not None and first not in self.runningEnds and first != self.wakeup:
+      # no job ends at the reserved start, thus, no event would call the scheduler
+      self.wakeup = first
+      schedList.append((Job(jobid="SleepScheduling", dummy=True), first - time, "default"))
+    return schedList
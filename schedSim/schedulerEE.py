@@ -1,7 +1,8 @@
 from schedSim.scheduler import FIFOScheduler, FIFOBackfillScheduler, FIFOBackfillDelayScheduler
 from schedSim.jobs import Job
+from schedSim.priceWindows import PriceWindows
 
-import datetime
+import numpy
 import sys
 
 class FIFOBackfillShutdownScheduler(FIFOBackfillScheduler):
@@ -9,28 +10,25 @@ class FIFOBackfillShutdownScheduler(FIFOBackfillScheduler):
   backfillLength = 1000
   sleepingNodes = 0
 
-  def tryToSchedule(self, time, jobCompleted):
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
     if not self.pendingList:
-      self.cluster.nodes += self.sleepingNodes # wakeup nodes virtually
-      self.sleepingNodes = self.cluster.nodes
-      self.cluster.nodes = 0
+      self.wakeUp()
+      self.sleep(self.cluster.nodes, [], freeNodeSet)
       return []
 
-    self.cluster.nodes += self.sleepingNodes # wakeup nodes virtually
-    self.sleepingNodes = 0
+    self.wakeUp()
 
     # Now try to retrieve as many jobs from the list as fit.
     schedList = []
     freeNodes = self.cluster.nodes
     i = 0
 
-    self.dispatchedJobs.sort() # sort the list
     self.purgeExpiredJobs(time)
 
-    while( i < len(self.pendingList) ):
-      job = self.pendingList[i]
+    for (pos, job) in self.pendingList.scan():
       if freeNodes == 0:
         self.dispatchJobs(time, schedList)
+        self.sleep(0, schedList, freeNodeSet)
         return schedList
       # print(job.submissionTime)
 
@@ -40,17 +38,15 @@ class FIFOBackfillShutdownScheduler(FIFOBackfillScheduler):
         # now we backfill
         i = i + 1
         if i > self.backfillLength:
-          self.sleepingNodes = freeNodes
-          self.cluster.nodes -= freeNodes
+          self.sleep(freeNodes, schedList, freeNodeSet)
           return schedList
         continue
 
       freeNodes = freeNodes - job.nodes
-      self.pendingList.pop(i)
+      self.pendingList.remove(pos)
       self.pickJobOptionsForSchedule(job, schedList)
 
-    self.sleepingNodes = freeNodes
-    self.cluster.nodes -= freeNodes
+    self.sleep(freeNodes, schedList, freeNodeSet)
     self.dispatchJobs(time, schedList)
     return schedList
 
@@ -60,14 +56,12 @@ class FIFOBackfillShutdownDelayScheduler(FIFOBackfillDelayScheduler):
   backfillLength = 1000
   sleepingNodes = 0
 
-  def tryToSchedule(self, time, jobCompleted):
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
     if not self.pendingList:
-      self.sleepingNodes += self.cluster.nodes
-      self.cluster.nodes = 0
+      self.sleep(self.cluster.nodes, [], freeNodeSet)
       return []
 
-    self.cluster.nodes += self.sleepingNodes # wakeup nodes virtually
-    self.sleepingNodes = 0
+    self.wakeUp()
 
     # Now try to retrieve as many jobs from the list as fit.
     schedList = []
@@ -76,23 +70,20 @@ class FIFOBackfillShutdownDelayScheduler(FIFOBackfillDelayScheduler):
       return schedList
 
     i = 0
-    while( i < len(self.pendingList) ):
-      job = self.pendingList[i]
+    for (pos, job) in self.pendingList.scan():
       #print("%d %d %d" % (i, time, job.nodes))
       if freeNodes < job.nodes:
         # now we backfill
         i = i + 1
         if i > self.backfillLength:
-          self.sleepingNodes = freeNodes
-          self.cluster.nodes -= freeNodes
+          self.sleep(freeNodes, schedList, freeNodeSet)
           return schedList
         continue
 
       freeNodes = freeNodes - job.nodes
-      self.pendingList.pop(i)
+      self.pendingList.remove(pos)
       self.pickJobOptionsForSchedule(job, schedList)
-    self.sleepingNodes = freeNodes
-    self.cluster.nodes -= freeNodes
+    self.sleep(freeNodes, schedList, freeNodeSet)
 
     return schedList
 
@@ -119,39 +110,33 @@ class FIFOPriceAwareShutdownScheduler(FIFOScheduler):
     #self.hoursMaxWaitingTime = int(data[1])
     #print("hours ahead: %s max-waiting-time-hours: %s" % tuple(data))
 
-  def tryToSchedule(self, time, jobCompleted):
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
     if not self.pendingList:
-      self.cluster.nodes += self.sleepingNodes # wakeup nodes virtually
-      self.sleepingNodes = self.cluster.nodes
-      self.cluster.nodes = 0
+      self.wakeUp()
+      self.sleep(self.cluster.nodes, [], freeNodeSet)
       return []
 
     # Now try to retrieve as many jobs from the list as fit.
     schedList = []
-    self.cluster.nodes += self.sleepingNodes # wakeup nodes virtually
-    self.sleepingNodes = 0
+    self.wakeUp()
     freeNodes = self.cluster.nodes
 
-    if freeNodes < self.pendingList[0].nodes:# or time < self.sleepEndTime:
-      self.sleepingNodes = freeNodes
-      self.cluster.nodes = 0
+    if freeNodes < self.pendingList.first().nodes:# or time < self.sleepEndTime:
+      self.sleep(freeNodes, schedList, freeNodeSet)
 
       return []
 
     # find price for next X hours
-    price = []
-    for i in range(0, self.hoursAhead):
-      price.append(self.energyModel.timestampPrice(time + i*3600))
-
-    timestamp = datetime.datetime.fromtimestamp(time)
+    prices = PriceWindows(self.energyModel, time, self.hoursAhead)
+    tSecRemainThisHour = prices.secondsRemainingThisHour
 
     i = 0
-    while( i < len(self.pendingList) ):
-      job = self.pendingList[i]
+    for (pos, job) in self.pendingList.scan():
       #print(job)
 
       #print(job)
       if freeNodes == 0:
+        self.sleep(0, schedList, freeNodeSet)
         return schedList
       #print("%d %d %d" % (i, time, job.nodes))
       if freeNodes < job.nodes:
@@ -168,81 +153,18 @@ class FIFOPriceAwareShutdownScheduler(FIFOScheduler):
         # we may delay the job
         remainingSeconds = job.durationMin % 3600
         # compute energy cost for all starting times, for all windows
-        cheapestPrice = 0
-        expensivePrice = 0
-        cheapestConfig = []
-
         # price for running the job now!
-        tSecRemainThisHour = (59 - timestamp.minute) * 60 + 60 - timestamp.second
-        if tSecRemainThisHour > remainingSeconds:
-          cPrice = price[0] * remainingSeconds
-        else:
-          cPrice = price[0] * tSecRemainThisHour
-          for h in range(1, hoursNeeded):
-            cPrice += price[h] * 3600
-          tRemaining = job.durationMin - tSecRemainThisHour - 3600 * (hoursNeeded - 1)
-          if tRemaining > 0:
-            cPrice += price[hoursNeeded] * tRemaining
-        cPrice = cPrice * jobPowerConsumption / 1000 / 3600 * 0.999 # favorise immediate start
-
+        cheapestPrice = prices.costsNow(job.durationMin, jobPowerConsumption)
         cheapestConfig = [0, False]
-        cheapestPrice = cPrice
-        expensivePrice = cPrice
-        #print(cPrice)
 
         # price for delaying the job
-        # price for delaying until the end of this hour
-        idlePrice = price[0] * tSecRemainThisHour * nodesForJobIdleConsumption / 1000 / 3600
-        secondsFullHourEmpty = (3600 - remainingSeconds)
-
         if job.durationMin < 3600:
-          for w in range(1, self.hoursAhead):
-            #print(idlePrice)
-            cPrice = idlePrice + price[w] * jobPowerConsumption * remainingSeconds / 1000 / 3600
-            if cPrice < cheapestPrice:
-              cheapestPrice = cPrice
-              cheapestConfig = [w, True]
-            idlePrice += price[w] * nodesForJobIdleConsumption / 1000 * 3600 / 3600
+          idle = prices.idleCosts(self.hoursAhead, nodesForJobIdleConsumption, prices.price * nodesForJobIdleConsumption / 1000 * 3600 / 3600)
+          hour = prices.cheapestShortJob(cheapestPrice, remainingSeconds, jobPowerConsumption, idle)
+          if hour != 0:
+            cheapestConfig = [hour, True]
         else:
-          for w in range(1, self.hoursAhead - hoursNeeded - 1):
-            # pay a price for leaving the node empty:
-            cPrice = idlePrice
-
-            #print(idlePrice)
-
-            # shortcut
-            if idlePrice > cheapestPrice:
-              break
-
-            # price for running the job
-            for h in range(w, hoursNeeded + w):
-              cPrice += price[h] * jobPowerConsumption / 1000
-
-            # check bounding box, first and last interval
-            # Compute price when running it now, or when running it in the last hour
-            pLast = price[hoursNeeded + w + 1] * (jobPowerConsumption * remainingSeconds + secondsFullHourEmpty * nodesForJobIdleConsumption ) / 1000 / 3600
-
-            pFirst = price[w - 1] * (remainingSeconds * jobPowerConsumption + (secondsFullHourEmpty - remainingSeconds) * nodesForJobIdleConsumption) / 1000 / 3600
-
-            ePrice = cPrice
-            if pFirst > pLast or w == 1:
-              last = True
-              cPrice += pLast
-              ePrice += pFirst
-            else:
-              last = False
-              cPrice += pFirst
-              ePrice += pLast
-            #print(cPrice)
-
-            if cPrice < cheapestPrice:
-              cheapestPrice = cPrice
-              cheapestConfig = [w, last]
-            if cPrice > expensivePrice:
-              expensivePrice = cPrice
-
-            # pay a price for leaving the node empty for this hour
-            idlePrice += price[w] * nodesForJobIdleConsumption / 1000
+          cheapestConfig = prices.cheapestLongJob(cheapestPrice, hoursNeeded, remainingSeconds, jobPowerConsumption, nodesForJobIdleConsumption) or cheapestConfig
 
         (hour, last) = cheapestConfig
         #print("Cheapest %d %d" % (hour, last))
@@ -252,8 +174,7 @@ class FIFOPriceAwareShutdownScheduler(FIFOScheduler):
             delay += tSecRemainThisHour
           else: #first
             delay += tSecRemainThisHour - remainingSeconds
-          self.sleepingNodes = freeNodes
-          self.cluster.nodes -= freeNodes
+          self.sleep(freeNodes, schedList, freeNodeSet)
 
           self.sleepEndTime = time + delay
           #print([time, cheapestConfig, job, self.sleepEndTime])
@@ -265,11 +186,10 @@ class FIFOPriceAwareShutdownScheduler(FIFOScheduler):
 
       # now we dispatch the job
       freeNodes = freeNodes - job.nodes
-      self.pendingList.pop(i)
+      self.pendingList.remove(pos)
       self.pickJobOptionsForSchedule(job, schedList)
 
-    self.sleepingNodes = freeNodes
-    self.cluster.nodes -= freeNodes
+    self.sleep(freeNodes, schedList, freeNodeSet)
     return schedList
 
 
@@ -297,37 +217,31 @@ class PriceAwareShutdownScheduler(FIFOScheduler):
     #self.hoursMaxWaitingTime = int(data[1])
     #print("hours ahead: %s max-waiting-time-hours: %s" % tuple(data))
 
-  def tryToSchedule(self, time, jobCompleted):
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
     if not self.pendingList:
-      self.cluster.nodes += self.sleepingNodes # wakeup nodes virtually
-      self.sleepingNodes = self.cluster.nodes
-      self.cluster.nodes = 0
+      self.wakeUp()
+      self.sleep(self.cluster.nodes, [], freeNodeSet)
       return []
 
     # Now try to retrieve as many jobs from the list as fit.
     schedList = []
-    self.cluster.nodes += self.sleepingNodes # wakeup nodes virtually
-    self.sleepingNodes = 0
+    self.wakeUp()
     freeNodes = self.cluster.nodes
 
-    if freeNodes < self.pendingList[0].nodes or time < self.sleepEndTime:
-      self.sleepingNodes = freeNodes
-      self.cluster.nodes = 0
+    if freeNodes < self.pendingList.first().nodes or time < self.sleepEndTime:
+      self.sleep(freeNodes, schedList, freeNodeSet)
 
       return []
 
     # find price for next X hours
-    price = []
-    for i in range(0, self.hoursAhead):
-      price.append(self.energyModel.timestampPrice(time + i*3600))
-
-    timestamp = datetime.datetime.fromtimestamp(time)
+    prices = PriceWindows(self.energyModel, time, self.hoursAhead)
+    tSecRemainThisHour = prices.secondsRemainingThisHour
 
     i = 0
-    while( i < len(self.pendingList) ):
-      job = self.pendingList[i]
+    for (pos, job) in self.pendingList.scan():
       #print(job)
       if freeNodes == 0:
+        self.sleep(0, schedList, freeNodeSet)
         return schedList
       #print("%d %d %d" % (i, time, job.nodes))
       if freeNodes < job.nodes:
@@ -343,78 +257,18 @@ class PriceAwareShutdownScheduler(FIFOScheduler):
         # we may delay the job
         remainingSeconds = job.durationMin % 3600
         # compute energy cost for all starting times, for all windows
-        cheapestPrice = 0
-        expensivePrice = 0
-        cheapestConfig = []
-
         # price for running the job now!
-        tSecRemainThisHour = (59 - timestamp.minute) * 60 + 60 - timestamp.second
-        if tSecRemainThisHour > remainingSeconds:
-          cPrice = price[0] * remainingSeconds
-        else:
-          cPrice = price[0] * tSecRemainThisHour
-          for h in range(1, hoursNeeded):
-            cPrice += price[h] * 3600
-          tRemaining = job.durationMin - tSecRemainThisHour - 3600 * (hoursNeeded - 1)
-          if tRemaining > 0:
-            cPrice += price[hoursNeeded] * tRemaining
-        cPrice = cPrice * jobPowerConsumption / 1000 / 3600 * 0.999 # favorise immediate start
-
+        cheapestPrice = prices.costsNow(job.durationMin, jobPowerConsumption)
         cheapestConfig = [0, False]
-        cheapestPrice = cPrice
-        expensivePrice = cPrice
-        #print(cPrice)
 
         # price for delaying the job
-        # price for delaying until the end of this hour
-        idlePrice = price[0] * tSecRemainThisHour * nodesForJobIdleConsumption / 1000 / 3600
-        secondsFullHourEmpty = (3600 - remainingSeconds)
-
         if job.durationMin < 3600:
-          for w in range(1, self.hoursAhead):
-            cPrice = idlePrice + price[w] * jobPowerConsumption * remainingSeconds / 1000 / 3600
-            if cPrice < cheapestPrice:
-              cheapestPrice = cPrice
-              cheapestConfig = [w, True]
-            idlePrice += price[w] * nodesForJobIdleConsumption / 1000
+          idle = prices.idleCosts(self.hoursAhead, nodesForJobIdleConsumption, prices.price * nodesForJobIdleConsumption / 1000)
+          hour = prices.cheapestShortJob(cheapestPrice, remainingSeconds, jobPowerConsumption, idle)
+          if hour != 0:
+            cheapestConfig = [hour, True]
         else:
-          for w in range(1, self.hoursAhead - hoursNeeded - 1):
-            # pay a price for leaving the node empty:
-            cPrice = idlePrice
-
-            # shortcut
-            if idlePrice > cheapestPrice:
-              break
-
-            # price for running the job
-            for h in range(w, hoursNeeded + w):
-              cPrice += price[h] * jobPowerConsumption / 1000
-
-            # check bounding box, first and last interval
-            # Compute price when running it now, or when running it in the last hour
-            pLast = price[hoursNeeded + w + 1] * (jobPowerConsumption * remainingSeconds + secondsFullHourEmpty * nodesForJobIdleConsumption ) / 1000 / 3600
-
-            pFirst = price[w - 1] * (remainingSeconds * jobPowerConsumption + (secondsFullHourEmpty - remainingSeconds) * nodesForJobIdleConsumption) / 1000 / 3600
-
-            ePrice = cPrice
-            if pFirst > pLast or w == 1:
-              last = True
-              cPrice += pLast
-              ePrice += pFirst
-            else:
-              last = False
-              cPrice += pFirst
-              ePrice += pLast
-            #print(cPrice)
-
-            if cPrice < cheapestPrice:
-              cheapestPrice = cPrice
-              cheapestConfig = [w, last]
-            if cPrice > expensivePrice:
-              expensivePrice = cPrice
-
-            # pay a price for leaving the node empty for this hour
-            idlePrice += price[w] * nodesForJobIdleConsumption / 1000
+          cheapestConfig = prices.cheapestLongJob(cheapestPrice, hoursNeeded, remainingSeconds, jobPowerConsumption, nodesForJobIdleConsumption) or cheapestConfig
 
         (hour, last) = cheapestConfig
         if hour != 0: # otherwise schedule now!
@@ -423,8 +277,7 @@ class PriceAwareShutdownScheduler(FIFOScheduler):
             delay += tSecRemainThisHour
           else: #first
             delay += tSecRemainThisHour - remainingSeconds
-          self.sleepingNodes = freeNodes
-          self.cluster.nodes -= freeNodes
+          self.sleep(freeNodes, schedList, freeNodeSet)
 
           self.sleepEndTime = time + delay
           #print([time, cheapestConfig, job, self.sleepEndTime])
@@ -433,11 +286,10 @@ class PriceAwareShutdownScheduler(FIFOScheduler):
 
       # now we dispatch the job
       freeNodes = freeNodes - job.nodes
-      self.pendingList.pop(i)
+      self.pendingList.remove(pos)
       self.pickJobOptionsForSchedule(job, schedList)
 
-    self.sleepingNodes = freeNodes
-    self.cluster.nodes -= freeNodes
+    self.sleep(freeNodes, schedList, freeNodeSet)
     return schedList
 
 
@@ -457,7 +309,7 @@ class EnforcePriceAwareShutdownScheduler(FIFOScheduler):
     #self.hoursMaxWaitingTime = int(data[1])
     #print("hours ahead: %s max-waiting-time-hours: %s" % tuple(data))
 
-  def tryToSchedule(self, time, jobCompleted):
+  def tryToSchedule(self, time, jobCompleted, freeNodeSet = None):
     if not self.pendingList:
       return []
 
@@ -465,22 +317,18 @@ class EnforcePriceAwareShutdownScheduler(FIFOScheduler):
       return []
 
     # find price for next X hours
-    price = []
-    for i in range(0, self.hoursAhead):
-      price.append(self.energyModel.timestampPrice(time + i*3600))
+    prices = PriceWindows(self.energyModel, time, self.hoursAhead)
+    tSecRemainThisHour = prices.secondsRemainingThisHour
 
-    timestamp = datetime.datetime.fromtimestamp(time)
-
-    self.cluster.nodes += self.sleepingNodes # wakeup nodes virtually
-    self.sleepingNodes = 0
+    self.wakeUp()
 
     # Now try to retrieve as many jobs from the list as fit.
     schedList = []
     freeNodes = self.cluster.nodes
     i = 0
-    while( i < len(self.pendingList) ):
-      job = self.pendingList[i]
+    for (pos, job) in self.pendingList.scan():
       if freeNodes == 0:
+        self.sleep(0, schedList, freeNodeSet)
         return schedList
       #print("%d %d %d" % (i, time, job.nodes))
       if freeNodes < job.nodes:
@@ -494,74 +342,19 @@ class EnforcePriceAwareShutdownScheduler(FIFOScheduler):
         # we may delay the job
         remainingSeconds = job.durationMin % 3600
         # compute energy cost for all starting times, for all windows
-        cheapestPrice = 0
-        expensivePrice = 0
-        cheapestConfig = []
-
         # price for running the job now!
-        tSecRemainThisHour = (59 - timestamp.minute) * 60 + 60 - timestamp.second
-        if tSecRemainThisHour > remainingSeconds:
-          cPrice = price[0] * remainingSeconds
-        else:
-          cPrice = price[0] * tSecRemainThisHour
-          for h in range(1, hoursNeeded):
-            cPrice += price[h] * 3600
-          tRemaining = job.durationMin - tSecRemainThisHour - 3600 * (hoursNeeded - 1)
-          if tRemaining > 0:
-            cPrice += price[hoursNeeded] * tRemaining
-        cPrice = cPrice * jobPowerConsumption / 1000 / 3600 * 0.999 # favorise immediate start
-
-        #print(["now", price[0], cPrice, tSecRemainThisHour, remainingSeconds])
-
+        cheapestPrice = prices.costsNow(job.durationMin, jobPowerConsumption)
         cheapestConfig = [0, False]
-        cheapestPrice = cPrice
-        expensivePrice = cPrice
-        #print(cPrice)
 
         # price for delaying the job
-        # price for delaying until the end of this hour
-        secondsFullHourEmpty = (3600 - remainingSeconds)
         if job.durationMin < 3600:
-          minT = 1e309
-          step = 0
-          for w in range(1, self.hoursAhead):
-            if price[w] < minT:
-              minT = price[w]
-              step = w
-          minT = minT * jobPowerConsumption * remainingSeconds / 1000 / 3600
-          if minT < cPrice:
+          step = 1 + int(numpy.argmin(prices.price[1:self.hoursAhead]))
+          minT = prices.prices[step] * jobPowerConsumption * remainingSeconds / 1000 / 3600
+          if minT < cheapestPrice:
             cheapestPrice = minT
             cheapestConfig = [step, True]
         else:
-          for w in range(1, self.hoursAhead - hoursNeeded - 1):
-            # pay a price for leaving the node empty:
-            cPrice = 0
-
-            # price for running the job
-            for h in range(w, hoursNeeded + w):
-              cPrice += price[h] * jobPowerConsumption / 1000
-
-            # check bounding box, first and last interval
-            # Compute price when running it now, or when running it in the last hour
-            pLast = price[hoursNeeded + w + 1] * jobPowerConsumption * remainingSeconds / 1000 / 3600
-
-            pFirst = price[w - 1] * (remainingSeconds * jobPowerConsumption) / 1000 / 3600
-
-            #print([w, price[w - 1], pLast, pFirst, cPrice])
-            ePrice = cPrice
-            if pFirst > pLast or w == 1:
-              last = True
-              cPrice += pLast
-              ePrice += pFirst
-            else:
-              last = False
-              cPrice += pFirst
-              ePrice += pLast
-            if cPrice < cheapestPrice * 0.999:
-              cheapestPrice = cPrice
-              cheapestConfig = [w, last]
-            if cPrice > expensivePrice:
-              expensivePrice = cPrice
+          cheapestConfig = prices.cheapestLongJobEnforced(cheapestPrice, hoursNeeded, remainingSeconds, jobPowerConsumption) or cheapestConfig
 
         (hour, last) = cheapestConfig
         #print([cheapestConfig, cheapestPrice, job])
@@ -571,16 +364,14 @@ class EnforcePriceAwareShutdownScheduler(FIFOScheduler):
             delay += tSecRemainThisHour
           else:
             delay += tSecRemainThisHour - remainingSeconds
-          self.sleepingNodes = freeNodes
-          self.cluster.nodes -= freeNodes
+          self.sleep(freeNodes, schedList, freeNodeSet)
           self.sleepEndTime = time + delay
           return schedList + [[Job(jobid="SleepScheduling",dummy=True), delay, "default" ]]
 
       # now we dispatch the job
       freeNodes = freeNodes - job.nodes
-      self.pendingList.pop(i)
+      self.pendingList.remove(pos)
       self.pickJobOptionsForSchedule(job, schedList)
 
-    self.sleepingNodes = freeNodes
-    self.cluster.nodes -= freeNodes
+    self.sleep(freeNodes, schedList, freeNodeSet)
     return schedList
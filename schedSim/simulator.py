@@ -1,8 +1,17 @@
 # import copy
+import itertools
 import numpy
+import os
 import sys
+import time as Time
+import traceback
 
+from schedSim.eventQueue import EventQueue
 from schedSim.failureModel import FailureModelMTTBF
+from schedSim.jobTrace import JobTrace
+from schedSim.nodeAllocator import NodeAllocator, NodeSet, FREE, BUSY, SLEEPING
+from schedSim.snapshot import saveSnapshot, loadSnapshot
+from schedSim.reporter import branchFileName
 
 from heapq import heappop, heappush
 
@@ -16,123 +25,386 @@ EMPTY_NODE_FAILURE = 5
 NODE_REPAIRED = 6
 
 
+class JobStream:
+  '''Reads jobs from an iterator sorted by submission time, next is the upcoming job or None if all jobs are read.
+  Jobs that do not fit the cluster are skipped.
+  Small disorder, e.g., caused by daylight saving time, is corrected using a buffer of reorderWindow jobs.'''
+
+  def __init__(self, jobs, cluster, reorderWindow = 10000):
+    self.jobs = iter(jobs)
+    self.nodesTotal = cluster.nodes
+    self.reorderWindow = reorderWindow
+    self.jobCount = 0
+    self.longestJobRuntime = 0
+    self.minNodeRuntime = 0 # TODO check for shared jobs
+    self.buffer = [] # heap of (submissionTime, jobCount, job)
+    self.next = None
+    self._advance()
+
+  def _advance(self):
+    for j in self.jobs:
+      self.jobCount = self.jobCount + 1
+      if j.nodes > self.nodesTotal: # or j.PPN > (cluster.cpusPerProcessor * cluster.processorsPerNode):  NO PPN check because of hyperthreading
+        print("[SIM] WARNING skipped job because it needs too many nodes: " + str(j))
+        continue
+      self.minNodeRuntime = self.minNodeRuntime + j.durationMin * j.nodes
+      if j.durationMin > self.longestJobRuntime:
+        self.longestJobRuntime = j.durationMin
+      heappush(self.buffer, (j.submissionTime, self.jobCount, j))
+      if len(self.buffer) >= self.reorderWindow:
+        break
+    self.next = self.buffer[0][2] if self.buffer else None
+
+  def __getstate__(self):
+    'The iterator is not stored in a snapshot, the jobs that are already read are skipped when the simulation is resumed'
+    state = dict(self.__dict__)
+    state["jobs"] = None
+    return state
+
+  def resume(self, jobs):
+    'Continue to read the jobs after the jobCount jobs that are read already'
+    self.jobs = itertools.islice(iter(jobs), self.jobCount, None) if self.next != None else iter(())
+
+  def pop(self):
+    (_, _, j) = heappop(self.buffer)
+    self._advance()
+    return j
+
+  def pushUntil(self, el, time, now = None):
+    '''Add all jobs submitted until time (None: all jobs, only when they are not streamed) to the event list.
+    A job submitted before now is out of order and submitted at now'''
+    while self.next != None and (time == None or self.next.submissionTime <= time):
+      j = self.pop()
+      submissionTime = j.submissionTime
+      if now != None and submissionTime < now:
+        print("[SIM] WARNING: the jobs are not sorted by submission time, submitting the job late: %s" % j)
+        submissionTime = now
+      el.push(submissionTime, JOB_SUBMITTED, j)
+
+  def printStatistics(self):
+    print("[SIM] %d jobs, optimal runtime with 100%% utilization on %d nodes == %.2f days (longest job: %.2f days)" % (self.jobCount, self.nodesTotal, self.minNodeRuntime / float(self.nodesTotal) / 3600 / 24, self.longestJobRuntime / 3600.0 / 24) )
+
+
+class Branch:
+  '''A branch of a forked simulation, it continues with its own scheduler and/or energy model.
+  The output files of the branch are named with branchFileName()'''
+
+  def __init__(self, name, scheduler = None, energyModel = None):
+    self.name = name
+    self.scheduler = scheduler
+    self.energyModel = energyModel
+
+  def __repr__(self):
+    return "Branch(%s)" % self.name
+
+
 class Simulator:
   '''
   This class contains the discrete event simulator
 
   Scheduling of jobs is performed as follows:
   1) Whenever a job submission is done, a START_SCHEDULER event is created a number second later (determined by the scheduler's schedulingDelay() method) before trying to schedule. Multiple submissions are batched and only one such event is created. This allows collecting of multiple jobs and prevents that the scheduler makes suboptimal decision when multiple jobs are submitted at one given time.
-  2) When a job is terminated or the START_SCHEDULER event occurs, the scheduler's tryToSchedule() method is called and the returned list of jobs is stared. The scheduler has to ensure that the jobs fit on the currently available nodes.
+  2) When a job is terminated or the START_SCHEDULER event occurs, the scheduler's tryToSchedule() method is called and the returned list of jobs is stared. The scheduler has to ensure that the jobs fit on the currently available nodes. If several events occur at the same time, tryToSchedule() is called once after all of them are processed.
   3) If a node fails, the job on all its nodes is terminated and must be restarted.
 
   Running jobs are managed by the scheduler but starting a job/stopping is adjusted by the Simulator.
   Pending jobs are completely managed by the scheduler and not known by the simulator.
   Managing the list by the scheduler gives it the chance to optimize the data structures based on the scheduling algorithm.
-  '''
-
-
-  def simulate(self, cluster, jobs, scheduler, energyModel, reporter, errorModel = True):
-    nodesTotal = cluster.nodes
-
-    el = []
-    failureModel = FailureModelMTTBF()
-
-    longestJobRuntime = 0
-    minNodeRuntime = 0 # TODO check for shared jobs
-    for j in jobs:
-      if j.nodes > cluster.nodes: # or j.PPN > (cluster.cpusPerProcessor * cluster.processorsPerNode):  NO PPN check because of hyperthreading
-          print("[SIM] WARNING skipped job because it needs too many nodes: " + str(j))
-      else:
-          heappush(el, (j.submissionTime, JOB_SUBMITTED, j) )
-          minNodeRuntime = minNodeRuntime + j.durationMin * j.nodes
-          if j.durationMin > longestJobRuntime:
-              longestJobRuntime = j.durationMin
-
-
-    print("[SIM] %d jobs, optimal runtime with 100%% utilization on %d nodes == %.2f days (longest job: %.2f days)" % (len(jobs), cluster.nodes, minNodeRuntime / float(cluster.nodes) / 3600 / 24, longestJobRuntime / 3600.0 / 24) )
 
-    pendingJobsToSubmit = []
+  Jobs can be streamed: an iterator sorted by submission time is merged with the event list, a job is read once the simulation reaches its submission time.
+  Thus, only submitted but not completed jobs are kept in memory.
 
-    scheduler.setCluster(cluster, energyModel)
-    reporter.setCluster(cluster, energyModel)
-    failureModel.setCluster(cluster)
+  If snapshotFile is set, the state of the simulation is written to it periodically, resume() continues the simulation from the last snapshot.
 
-    startScheduler = False
+  If branches are set, the simulation forks a process for every branch once it reaches forkTime, thus, the branches share the simulation up to forkTime without copying it.
+  Every branch continues with its scheduler or energy model and writes copies of the output, the process continues the simulation unchanged and waits for the branches at the end.
+  The branches start with the same state of the random generator, i.e., the failures are drawn from the same numbers as long as they are drawn in the same order.
 
-    if (len(el) == 0):
-        print("[SIM] Nothing to do, no jobs available!")
-        sys.exit(1)
-
-    firstJob = el[0]
-    starttime = firstJob[0]
-    time = starttime
-    completedJobs = 0
-    jobCount = len(jobs)
-    lasttime = time
+  By default only the number of free nodes is tracked in cluster.nodes.
+  If nodeAllocation is set, the state of every node is tracked in cluster.allocator, a NodeAllocator, and a started job is placed on job.nodeSet.
+  Then tryToSchedule() gets the NodeSet of the free and sleeping nodes, a scheduler may place a job on some of them by setting job.nodeSet, otherwise the nodes are allocated first fit or preferably contiguous.
+  The shutdown schedulers choose the nodes to put to sleep themselves, see Scheduler.sleep().
+  Schedulers that only reduce cluster.nodes to put nodes to sleep keep working, the free nodes beyond cluster.nodes are set to sleeping after each scheduling pass.
+  '''
 
-    energyModel.initTimestamp(time) # initialize time
+  # number of streamed jobs that are read ahead to correct small disorder of submission times
+  streamReorderWindow = 10000
+
+  # None: count the free nodes only, "firstFit" or "contiguous": track the state of every node
+  nodeAllocation = None
+
+  # the file to write snapshots to, they are written every snapshotInterval simulated seconds or snapshotWallInterval seconds of the wall clock
+  snapshotFile = None
+  snapshotInterval = None
+  snapshotWallInterval = None
+
+  # the simulated time at which the branches are forked
+  forkTime = None
+  branches = None
+
+  def resume(self, filename, jobs = None):
+    '''Continue the simulation from the snapshot, the output of the reporter continues from the snapshot as well.
+    The streamed jobs must be given again, the jobs read before the snapshot are skipped'''
+    snapshot = loadSnapshot(filename)
+    self.nodeAllocation = snapshot["nodeAllocation"]
+    self.simulate(snapshot["cluster"], jobs, snapshot["scheduler"], snapshot["energyModel"], snapshot["reporter"], snapshot["errorModel"], snapshot)
+
+  def simulate(self, cluster, jobs, scheduler, energyModel, reporter, errorModel = True, snapshot = None):
+    '''Simulate the execution of the jobs.
+    jobs is either a list of Job objects that is added to the event list at once, or a JobTrace or an iterator of jobs sorted by submission time that are streamed
+    snapshot: the loaded snapshot to continue from, see resume()'''
+    self.branch = None # the branch of a forked process
+    self.branchProcesses = []
+    try:
+      self._simulate(cluster, jobs, scheduler, energyModel, reporter, errorModel, snapshot)
+    except BaseException:
+      if self.branch == None:
+        raise
+      traceback.print_exc()
+      sys.stdout.flush()
+      os._exit(1)
+    if self.branch != None:
+      # the forked process must not return to the caller
+      sys.stdout.flush()
+      os._exit(0)
+    for (branch, pid) in self.branchProcesses:
+      (_, status) = os.waitpid(pid, 0)
+      if status != 0:
+        print("[SIM] WARNING: branch %s failed" % branch.name)
+
+  def _fork(self, reporter):
+    'Fork a process for every branch, returns the branch in the forked process and None in this process'
+    # buffered output would be written by every process
+    reporter.flush()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    for branch in self.branches:
+      pid = os.fork()
+      if pid == 0:
+        self.branch = branch
+        self.branchProcesses = []
+        return branch
+      self.branchProcesses.append((branch, pid))
+    return None
+
+  def _startBranch(self, branch, cluster, scheduler, energyModel, reporter, el, time, starttime):
+    'Continue the simulation with the scheduler and energy model of the branch, returns them'
+    print("[SIM] Branch %s starts at %d" % (branch.name, time))
+    reporter.branch(branch.name)
+    if branch.energyModel != None:
+      energyModel = branch.energyModel
+      energyModel.initTimestamp(starttime)
+      reporter.setEnergyModel(energyModel)
+      scheduler.energyModel = energyModel
+    if branch.scheduler != None:
+      previous = scheduler
+      scheduler = branch.scheduler
+      scheduler.setCluster(cluster, energyModel)
+      running = [job for (t, op, job) in el.events(JOB_COMPLETED)] + [job for (t, op, job) in el.events(JOB_STOPPED_WITH_FAILURES)]
+      scheduler.takeOver(previous, running, time)
+      if cluster.allocator:
+        cluster.allocator.setAwake(cluster.nodes)
+    return (scheduler, energyModel)
+
+  def _simulate(self, cluster, jobs, scheduler, energyModel, reporter, errorModel, snapshot):
+    contiguous = self.nodeAllocation == "contiguous"
+    if snapshot == None:
+      nodesTotal = cluster.nodes
+
+      el = EventQueue()
+      failureModel = FailureModelMTTBF()
+
+      streaming = not isinstance(jobs, list)
+      if isinstance(jobs, JobTrace) and not jobs.isSorted():
+        print("[SIM] The trace is not sorted by submission time, it cannot be streamed")
+        jobs = jobs.toJobs()
+        streaming = False
+
+      stream = JobStream(jobs, cluster, self.streamReorderWindow if streaming else 1)
+      if streaming:
+        if stream.next != None:
+          stream.pushUntil(el, stream.next.submissionTime)
+      else:
+        stream.pushUntil(el, None)
+        stream.printStatistics()
+
+      pendingJobsToSubmit = []
+
+      scheduler.setCluster(cluster, energyModel)
+      reporter.setCluster(cluster, energyModel)
+      failureModel.setCluster(cluster)
+
+      allocator = None
+      if self.nodeAllocation != None:
+        if self.nodeAllocation not in ("firstFit", "contiguous"):
+          raise Exception("Unknown node allocation: %s" % self.nodeAllocation)
+        allocator = NodeAllocator(nodesTotal)
+      cluster.allocator = allocator
+
+      startScheduler = False
+
+      if (len(el) == 0):
+          print("[SIM] Nothing to do, no jobs available!")
+          sys.exit(1)
+
+      starttime = el.nextTime()
+      time = starttime
+      completedJobs = 0
+      lasttime = time
+
+      energyModel.initTimestamp(time) # initialize time
+
+      if not streaming:
+        # the scheduler can only see all jobs if they are not streamed
+        scheduler.submitAllJobsWithStartTime(jobs, time)
+
+      self.coalescedPasses = 0
+
+      # the idle nodes fail as one Poisson process, its next failure is drawn again when their number changes
+      # the time of the next failure is kept outside of the event list, thus, a new draw replaces it
+      idleNodes = 0
+      idleFailureTime = None
+
+      oldtime = -1
+    else:
+      (nodesTotal, el, failureModel, stream, streaming, pendingJobsToSubmit, startScheduler, starttime, time, completedJobs, idleNodes, idleFailureTime, oldtime, self.coalescedPasses) = snapshot["simulation"]
+      numpy.random.set_state(snapshot["random"])
+      if jobs == None and stream.next != None:
+        raise Exception("The streamed jobs are needed to resume the simulation")
+      stream.resume(jobs)
+      allocator = cluster.allocator
+      print("[SIM] Resuming the simulation at %d" % time)
+
+    # the hooks of the reporter, events that are not handled are not dispatched
+    jobSubmitted = reporter.hook("jobSubmitted")
+    jobFinished = reporter.hook("jobFinished")
+    jobStarted = reporter.hook("jobStarted")
+    clusterStatusChanged = reporter.hook("clusterStatusChanged")
+    jobAbortedWithErrors = reporter.hook("jobAbortedWithErrors")
+    emptyNodeFailed = reporter.hook("emptyNodeFailed")
+    nodeRepaired = reporter.hook("nodeRepaired")
 
     fail = None
-    scheduler.submitAllJobsWithStartTime(jobs, time)
 
-    oldtime = -1
-    while(len(el) > 0):
+    # a scheduling pass is pending, it is executed once all events of the current time are processed
+    schedulePass = False
+    passAfterCompletion = False
+
+    # the branches are forked and snapshots are written after all events of a time are processed
+    forkTime = self.forkTime if self.branches and (snapshot == None or time < self.forkTime) else None
+    snapshotFile = self.snapshotFile
+    nextSnapshot = time + self.snapshotInterval if self.snapshotInterval else float("inf")
+    nextSnapshotWall = Time.monotonic() + self.snapshotWallInterval if self.snapshotWallInterval else float("inf")
+    while True:
+      if stream.next != None:
+        # if no event is left, only the jobs of the next submission are added
+        nextTime = el.nextTime()
+        stream.pushUntil(el, nextTime if nextTime != None else stream.next.submissionTime, oldtime)
+      if len(el) == 0 and stream.next == None and not schedulePass:
+        # only the idle nodes may fail
+        break
       reschedule = True
 
-      (time, op, job) = heappop(el)
+      if idleFailureTime != None and el.precedes(idleFailureTime, EMPTY_NODE_FAILURE):
+        (time, op, job) = (idleFailureTime, EMPTY_NODE_FAILURE, None)
+        idleFailureTime = None
+      else:
+        (time, op, job) = el.pop()
       #print("%d %s %s" % (time, op, job))
       assert time >= oldtime
       oldtime = time
 
-      if jobCount == completedJobs:
+      if stream.next == None and stream.jobCount == completedJobs:
         # may happen if we only see other events such as node repair events
         break
 
       if op == JOB_SUBMITTED:
-        reporter.jobSubmitted(time, job)
+        if jobSubmitted:
+          jobSubmitted(time, job)
         pendingJobsToSubmit.append(job)
         if not startScheduler:
-          heappush(el, (time + scheduler.schedulingDelay(), JOB_START_SCHEDULER, None))
+          el.push(time + scheduler.schedulingDelay(), JOB_START_SCHEDULER, None)
           startScheduler = True
-        continue
+        if not schedulePass:
+          continue
+        reschedule = False
 
       elif op == JOB_COMPLETED:
-        reporter.clusterStatusChanged(time)
-        reporter.jobFinished(time, job)
+        if clusterStatusChanged:
+          clusterStatusChanged(time)
+        if jobFinished:
+          jobFinished(time, job)
         cluster.nodes = cluster.nodes + job.nodes
+        if allocator:
+          allocator.release(job.nodeSet)
+          job.nodeSet = None
         scheduler.jobCompleted(job, time)
         completedJobs = completedJobs + 1
 
       elif op == EMPTY_NODE_FAILURE:
-        reporter.clusterStatusChanged(time)
+        if clusterStatusChanged:
+          clusterStatusChanged(time)
         cluster.nodes = cluster.nodes - 1
+        node = None
+        if allocator:
+          node = allocator.randomNode(allocator.nodes(FREE))
+          allocator.fail(node, FREE)
         repairDuration = failureModel.timeUntilNodeIsBack()
-        heappush(el, (time + repairDuration, NODE_REPAIRED, None))
+        el.push(time + repairDuration, NODE_REPAIRED, node)
         reschedule = False
-        reporter.emptyNodeFailed(time)
+        if emptyNodeFailed:
+          emptyNodeFailed(time)
 
       elif op == JOB_STOPPED_WITH_FAILURES:
-        reporter.clusterStatusChanged(time)
-        reporter.jobAbortedWithErrors(time, job)
+        if clusterStatusChanged:
+          clusterStatusChanged(time)
+        if jobAbortedWithErrors:
+          jobAbortedWithErrors(time, job)
         # Take one node offline
         cluster.nodes = cluster.nodes + job.nodes - 1
+        node = None
+        if allocator:
+          node = allocator.randomNode(job.nodeSet)
+          allocator.fail(node, BUSY)
+          allocator.release(NodeSet(job.nodeSet.mask & ~(1 << node)))
+          job.nodeSet = None
         scheduler.jobAbortedWithErrors(job, time)
         repairDuration = failureModel.timeUntilNodeIsBack()
-        heappush(el, (time + repairDuration, NODE_REPAIRED, None))
+        el.push(time + repairDuration, NODE_REPAIRED, node)
 
       elif op == NODE_REPAIRED:
-        reporter.clusterStatusChanged(time)
-        reporter.nodeRepaired(time)
+        if clusterStatusChanged:
+          clusterStatusChanged(time)
+        if nodeRepaired:
+          nodeRepaired(time)
         cluster.nodes = cluster.nodes + 1
+        if allocator:
+          allocator.repair(job)
 
       elif op == JOB_START_SCHEDULER:
         scheduler.newPendingJobs(pendingJobsToSubmit, time)
         pendingJobsToSubmit = []
         startScheduler = False
 
-      if reschedule:
-        reporter.clusterStatusChanged(time)
-        newJobs = scheduler.tryToSchedule(time, op == JOB_COMPLETED)
+      schedulePass = schedulePass or reschedule
+      passAfterCompletion = passAfterCompletion or op == JOB_COMPLETED
+      if schedulePass and (el.nextTime() == time or idleFailureTime == time):
+        # all events of this time are processed before one scheduling pass
+        if reschedule:
+          self.coalescedPasses = self.coalescedPasses + 1
+        continue
+
+      if schedulePass:
+        schedulePass = False
+        if clusterStatusChanged:
+          clusterStatusChanged(time)
+        if allocator:
+          newJobs = scheduler.tryToSchedule(time, passAfterCompletion, NodeSet(allocator.states[FREE] | allocator.states[SLEEPING]))
+        else:
+          newJobs = scheduler.tryToSchedule(time, passAfterCompletion)
+        passAfterCompletion = False
+        if allocator:
+          self._placeJobs(allocator, cluster, newJobs, contiguous)
 
         for newJob in newJobs:
           (job, runtime, partition) = newJob
@@ -141,10 +413,11 @@ class Simulator:
           if job.dummy:
             if job.jobid == "SleepScheduling":
               assert runtime > 0
-              heappush(el, (time + runtime, JOB_START_SCHEDULER, None))
+              el.push(time + runtime, JOB_START_SCHEDULER, None)
               continue
 
-          reporter.jobStarted(time, job, runtime, partition)
+          if jobStarted:
+            jobStarted(time, job, runtime, partition)
           cluster.nodes -= job.nodes
           assert cluster.nodes >= 0
 
@@ -153,20 +426,68 @@ class Simulator:
             fail = failureModel.checkWhenJobFails(job.nodes, runtime)
           if fail == None:
             job.endTime = time + runtime
-            heappush(el, (job.endTime, JOB_COMPLETED, job))
+            el.push(job.endTime, JOB_COMPLETED, job)
           else:
             job.endTime = time + fail
-            heappush(el, (job.endTime, JOB_STOPPED_WITH_FAILURES, job))
-
-      if errorModel and cluster.nodes > 0 and el:
-        # check now if some of the remaining nodes failed from now till the next event
-        fail = failureModel.checkWhenJobFails(cluster.nodes, el[0][0] - time)
-        if fail != None:
-          heappush(el, (time + fail, EMPTY_NODE_FAILURE, None))
-
-    reporter.clusterStatusChanged(time)
-
-    if completedJobs != jobCount:
-      print("WARNING: did not process all jobs, some missing (%d of %d completed)" % (completedJobs, len(jobs)))
+            el.push(job.endTime, JOB_STOPPED_WITH_FAILURES, job)
+
+        if allocator:
+          assert allocator.countOf(FREE) == cluster.nodes
+
+      if errorModel and cluster.nodes != idleNodes:
+        idleNodes = cluster.nodes
+        idleFailureTime = time + failureModel.timeUntilNodeFails(idleNodes) if idleNodes > 0 else None
+
+      if forkTime != None and time >= forkTime:
+        forkTime = None
+        branch = self._fork(reporter)
+        if branch != None:
+          (scheduler, energyModel) = self._startBranch(branch, cluster, scheduler, energyModel, reporter, el, time, starttime)
+          if snapshotFile != None:
+            snapshotFile = branchFileName(snapshotFile, branch.name)
+
+      if snapshotFile != None and (time >= nextSnapshot or Time.monotonic() >= nextSnapshotWall):
+        saveSnapshot(snapshotFile, {"cluster" : cluster, "scheduler" : scheduler, "energyModel" : energyModel, "reporter" : reporter, "errorModel" : errorModel, "nodeAllocation" : self.nodeAllocation, "random" : numpy.random.get_state(),
+          "simulation" : (nodesTotal, el, failureModel, stream, streaming, pendingJobsToSubmit, startScheduler, starttime, time, completedJobs, idleNodes, idleFailureTime, oldtime, self.coalescedPasses)})
+        if self.snapshotInterval:
+          nextSnapshot = time + self.snapshotInterval
+        if self.snapshotWallInterval:
+          nextSnapshotWall = Time.monotonic() + self.snapshotWallInterval
+
+    if clusterStatusChanged:
+      clusterStatusChanged(time)
+
+    if streaming:
+      stream.printStatistics()
+    print("[SIM] coalesced %d scheduling passes of events at the same time" % self.coalescedPasses)
+    if completedJobs != stream.jobCount:
+      print("WARNING: did not process all jobs, some missing (%d of %d completed)" % (completedJobs, stream.jobCount))
     cluster.nodes = nodesTotal
+    if allocator:
+      print("[SIM] %s" % allocator)
     reporter.printSummary(starttime, time)
+
+  def _placeJobs(self, allocator, cluster, newJobs, contiguous):
+    '''Place the jobs on nodes before they are started, the nodes the scheduler set in job.nodeSet are used first.
+    Afterwards, the number of free nodes is cluster.nodes minus the nodes of the jobs, the other nodes are set to sleeping or woken up'''
+    free = cluster.nodes
+    unplaced = []
+    for (job, runtime, partition) in newJobs:
+      if job.dummy:
+        continue
+      nodeSet = job.nodeSet
+      if nodeSet != None:
+        if len(nodeSet) != job.nodes:
+          raise Exception("The scheduler placed job %s on %d nodes instead of %d" % (job.jobid, len(nodeSet), job.nodes))
+        sleeping = allocator.states[SLEEPING] & nodeSet.mask
+        if sleeping:
+          allocator.move(NodeSet(sleeping), SLEEPING, FREE)
+        allocator.move(nodeSet, FREE, BUSY)
+        free = free - job.nodes
+      else:
+        unplaced.append(job)
+    allocator.setAwake(free)
+    for job in unplaced:
+      job.nodeSet = allocator.allocate(job.nodes, contiguous)
+      if job.nodeSet == None:
+        raise Exception("Not enough free nodes for job %s" % job.jobid)
@@ -0,0 +1,37 @@
+import os
+import pickle
+import zlib
+
+SNAPSHOT_MAGIC = b"SSSNAP2\n"
+# the zlib compression level of the snapshots
+SNAPSHOT_COMPRESSION = 1
+
+class SnapshotFile:
+  '''An open output file in a snapshot, it is stored by its name and position.
+  When the snapshot is loaded, the file is opened again and the content after the position is removed, thus, the output continues as if the simulation had not been interrupted.'''
+
+  def __init__(self, f):
+    f.flush()
+    self.name = os.path.abspath(f.name)
+    self.binary = "b" in f.mode
+    self.position = f.tell()
+
+  def reopen(self):
+    f = open(self.name, "r+b" if self.binary else "r+")
+    f.seek(self.position)
+    f.truncate()
+    return f
+
+def saveSnapshot(filename, state):
+  'Write the state atomically, an existing snapshot is replaced once the new one is complete'
+  tmp = "%s.%d.tmp" % (filename, os.getpid())
+  with open(tmp, "wb") as f:
+    f.write(SNAPSHOT_MAGIC)
+    f.write(zlib.compress(pickle.dumps(state, pickle.HIGHEST_PROTOCOL), SNAPSHOT_COMPRESSION))
+  os.replace(tmp, filename)
+
+def loadSnapshot(filename):
+  with open(filename, "rb") as f:
+    if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+      raise Exception("%s is not a snapshot" % filename)
+    return pickle.loads(zlib.decompress(f.read()))
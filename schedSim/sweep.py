@@ -0,0 +1,159 @@
+import contextlib
+import csv
+import itertools
+import multiprocessing
+import os
+import subprocess
+import time
+import traceback
+import numpy
+
+from schedSim.energyCosts import energyCostModelFactory
+from schedSim.jobReader import JobReader
+from schedSim.reporterUtilization import ReporterUtilization
+from schedSim.scheduler import SchedulerFactory
+from schedSim.simulator import Simulator
+
+# the statistics of SilentReporter.printSummary()
+STATS_COLUMNS = ["runtime_days", "nodetime", "jobsStarted", "utilization_percent", "energyConsumed", "costs_energy", "costsCenter", "costs", "nodeErrors", "nodesRepaired", "jobsAborted"]
+
+class SweepRun:
+  'The arguments of one simulation of a sweep, output is the prefix of the files written by the run'
+
+  fields = ["input", "configuration", "energyModel", "energyModelArgument", "scheduler", "schedulerArgument", "output", "limitCount", "errorModel"]
+
+  def __init__(self, input, configuration, output, energyModel = "FixedPrice", energyModelArgument = "", scheduler = "FIFO", schedulerArgument = "", limitCount = 100000000, errorModel = False):
+    self.input = input
+    self.configuration = configuration
+    self.output = output
+    self.energyModel = energyModel
+    self.energyModelArgument = energyModelArgument
+    self.scheduler = scheduler
+    self.schedulerArgument = schedulerArgument
+    self.limitCount = limitCount
+    self.errorModel = errorModel
+
+  def __repr__(self):
+    return "SweepRun(%s)" % ", ".join("%s=%s" % (f, getattr(self, f)) for f in self.fields)
+
+
+def grid(output, **axes):
+  '''Returns the runs for all combinations of the values of the axes.
+  Every axis is a list of values for an argument of SweepRun or a list of dicts that set several arguments at once.
+  The output is formatted with the arguments of the run, e.g., "output/{scheduler}-{schedulerArgument}", dicts may contain additional keys that are only used for the output'''
+  names = list(axes)
+  runs = []
+  for values in itertools.product(*[axes[n] for n in names]):
+    args = {}
+    for n, v in zip(names, values):
+      if isinstance(v, dict):
+        args.update(v)
+      else:
+        args[n] = v
+    runs.append(SweepRun(output = output.format(**args), **{k : v for k, v in args.items() if k in SweepRun.fields}))
+  return runs
+
+
+# The sweep that is executed, the worker processes are forked and read the loaded traces from here
+_activeSweep = None
+
+def _runSimulation(index):
+  return _activeSweep._runSimulation(index)
+
+
+class Sweep:
+  '''This class runs the simulations of a sweep in a pool of processes.
+  Every trace, energy model and configuration is loaded once before the workers are forked, thus, they share one copy that is not modified by the runs.
+  Every run is executed by a new process, it writes its output to the file output.txt; runs for which this file exists are skipped, the output of failed runs is moved to output.failed.txt.
+  The progress is printed and every run is appended to a CSV table when it finishes.'''
+
+  def __init__(self, runs, processes = None, results = "sweep-results.csv", statistics = False, rerun = False):
+    self.runs = runs
+    self.processes = processes or multiprocessing.cpu_count()
+    self.results = results
+    self.statistics = statistics
+    self.rerun = rerun
+    self.traces = {}
+    self.energyModels = {}
+    self.clusters = {}
+    self.errors = {}
+
+  def _load(self, cache, key, load):
+    'Load a shared object once, errors are reported by the runs that use it'
+    if key not in cache and key not in self.errors:
+      try:
+        cache[key] = load()
+      except Exception as e:
+        self.errors[key] = "%s: %s" % (type(e).__name__, e)
+        print("[SWEEP] Error loading %s: %s" % (key, self.errors[key]))
+
+  def _loadConfiguration(self, configuration):
+    env = {}
+    exec(open(configuration, "r").read(), env)
+    return env["Cluster"]
+
+  def _loadAll(self, runs):
+    reader = JobReader()
+    for r in runs:
+      self._load(self.traces, (r.input, r.limitCount), lambda: reader.jobs(r.input, limitCount = r.limitCount))
+      self._load(self.energyModels, (r.energyModel, r.energyModelArgument), lambda: energyCostModelFactory.createModel(r.energyModel, r.energyModelArgument))
+      self._load(self.clusters, r.configuration, lambda: self._loadConfiguration(r.configuration))
+
+  def _runSimulation(self, index):
+    'Executed in the worker, returns the status of the run, its time and the statistics'
+    r = self.runs[index]
+    t0 = time.time()
+    os.makedirs(os.path.dirname(r.output) or ".", exist_ok=True)
+    with open(r.output + ".txt", "w") as out, contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+      try:
+        for key in [(r.input, r.limitCount), (r.energyModel, r.energyModelArgument), r.configuration]:
+          if key in self.errors:
+            raise Exception("Could not load %s: %s" % (key, self.errors[key]))
+        # every worker is forked with the same state of the random generator
+        numpy.random.seed()
+        scheduler = SchedulerFactory().createScheduler(r.scheduler, r.schedulerArgument)
+        reporter = ReporterUtilization(r.output)
+        Simulator().simulate(self.clusters[r.configuration](), self.traces[(r.input, r.limitCount)], scheduler, self.energyModels[(r.energyModel, r.energyModelArgument)], reporter, r.errorModel)
+        out.flush()
+        if self.statistics:
+          subprocess.call(["./analysis/statistics.R", r.output + "-stats.csv"], stdout = out, stderr = out)
+      except Exception:
+        traceback.print_exc()
+        failed = True
+      else:
+        failed = False
+    if failed:
+      # failed runs are executed again by the next sweep
+      os.replace(r.output + ".txt", r.output + ".failed.txt")
+      return (index, "failed", time.time() - t0, {})
+    return (index, "ok", time.time() - t0, dict(reporter.stats))
+
+  def run(self):
+    'Execute all runs, returns the number of failed runs'
+    global _activeSweep
+
+    pending = [i for i, r in enumerate(self.runs) if self.rerun or not os.path.exists(r.output + ".txt")]
+    print("[SWEEP] %d runs, %d already done" % (len(self.runs), len(self.runs) - len(pending)))
+    self._loadAll([self.runs[i] for i in pending])
+
+    failed = 0
+    os.makedirs(os.path.dirname(self.results) or ".", exist_ok=True)
+    writeHeader = not os.path.exists(self.results)
+    with open(self.results, "a", newline="") as fd:
+      table = csv.writer(fd)
+      if writeHeader:
+        table.writerow(SweepRun.fields + ["status", "seconds"] + STATS_COLUMNS)
+      _activeSweep = self
+      try:
+        with multiprocessing.get_context("fork").Pool(self.processes, maxtasksperchild = 1) as pool:
+          for done, (index, status, seconds, stats) in enumerate(pool.imap_unordered(_runSimulation, pending), 1):
+            r = self.runs[index]
+            if status != "ok":
+              failed = failed + 1
+            print("[SWEEP] %d/%d %s %s (%.1fs)" % (done, len(pending), status, r.output, seconds))
+            table.writerow([getattr(r, f) for f in SweepRun.fields] + [status, "%.1f" % seconds] + [stats.get(s, "") for s in STATS_COLUMNS])
+            fd.flush()
+      finally:
+        _activeSweep = None
+    print("[SWEEP] finished, %d failed" % failed)
+    return failed
@@ -0,0 +1,84 @@
+import glob
+import hashlib
+import json
+import os
+
+from schedSim.jobTrace import JobTrace
+
+# increase if the parsed content of a file changes
+CACHE_VERSION = 1
+
+class TraceCache:
+  '''This class stores parsed text traces in the columnar format in a directory.
+  An entry is identified by the path, the size and modification time (or content hash) of the file and the arguments for parsing.
+  Entries of a file that changed are removed, the least recently used entries are removed if the cache exceeds maxBytes.'''
+
+  def __init__(self, directory = None, maxBytes = 4 * 1024 * 1024 * 1024, hashContent = False):
+    if directory == None:
+      directory = os.environ.get("SCHEDSIM_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "schedsim"))
+    self.directory = directory
+    self.maxBytes = maxBytes
+    self.hashContent = hashContent
+
+  def _hash(self, value):
+    return hashlib.sha1(json.dumps(value).encode("utf-8")).hexdigest()[:16]
+
+  def _fileIdentity(self, inFile):
+    st = os.stat(inFile)
+    if not self.hashContent:
+      return [st.st_size, st.st_mtime_ns]
+    h = hashlib.sha1()
+    with open(inFile, "rb") as fd:
+      for block in iter(lambda: fd.read(1024 * 1024), b""):
+        h.update(block)
+    return [st.st_size, h.hexdigest()]
+
+  def _entry(self, inFile, limitCount, partition):
+    'Returns the prefix of all entries for the file, the prefix of the entries for its current version and the name of the entry'
+    prefix = os.path.join(self.directory, self._hash(os.path.abspath(inFile)))
+    current = "%s-%s-" % (prefix, self._hash([CACHE_VERSION, self._fileIdentity(inFile)]))
+    arguments = self._hash([limitCount, None if partition == None else sorted(partition)])
+    return (prefix, current, "%s%s.trace" % (current, arguments))
+
+  def trace(self, inFile, limitCount, partition, parse):
+    '''Returns the cached trace or calls parse() to create it.
+    If the cache cannot be written, the parsed trace is returned.'''
+    (prefix, current, entry) = self._entry(inFile, limitCount, partition)
+    if os.path.exists(entry):
+      os.utime(entry)
+      return JobTrace.load(entry)
+
+    trace = parse()
+    try:
+      os.makedirs(self.directory, exist_ok=True)
+      # remove entries of older versions of the file
+      for f in glob.glob(prefix + "-*.trace"):
+        if not f.startswith(current):
+          os.remove(f)
+      tmp = "%s.%d.tmp" % (entry, os.getpid())
+      trace.save(tmp)
+      os.replace(tmp, entry)
+      self._evict(entry)
+    except OSError as e:
+      print("[Reader] Warning could not store the trace in the cache: %s" % e)
+      return trace
+    return JobTrace.load(entry)
+
+  def _evict(self, keep):
+    'Remove the least recently used entries until the cache is below maxBytes'
+    entries = []
+    for f in glob.glob(os.path.join(self.directory, "*.trace")):
+      st = os.stat(f)
+      entries.append((st.st_mtime, st.st_size, f))
+    total = sum(e[1] for e in entries)
+    for (mtime, size, f) in sorted(entries):
+      if total <= self.maxBytes:
+        break
+      if f == keep:
+        continue
+      os.remove(f)
+      total = total - size
+
+  def clear(self):
+    for f in glob.glob(os.path.join(self.directory, "*.trace")):
+      os.remove(f)
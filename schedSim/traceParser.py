@@ -0,0 +1,277 @@
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+import dateutil.parser
+import numpy
+
+from schedSim.jobTrace import JobTrace, CATEGORICAL_COLUMNS
+from schedSim.localTime import naiveToEpoch
+
+SLURM_HEADER = "jobid|jobname|partition|NNodes|NTasks|ReqMem|Submit|Start|Elapsed|Account|User|Timelimit|ConsumedEnergy|Priority|State|BatchOnly\n"
+LRZ_HEADER = "Scheduler assigned job id|Submission Time|Start Time|End Time|Status|Energy Tag|Number of Utilized Nodes|EtS (kWh)|APC (W)\n"
+
+# LRZ jobs submitted before 2014-01-01 are moved to this time
+LRZ_FIRST_SUBMISSION = 1388530800
+
+def parseTimestampSlow(timestamp):
+  return int(time.mktime(dateutil.parser.parse(timestamp).timetuple()))
+
+def parseTimestamps(timestamps):
+  '''Convert local timestamps to the epoch.
+  The format YYYY-MM-DD HH:MM:SS is converted vectorized using datetime64, only other rows are parsed by dateutil.'''
+  strings = numpy.array(timestamps, dtype=str)
+  result = numpy.empty(len(strings), dtype=numpy.int64)
+  if len(strings) == 0:
+    return result
+  fast = numpy.char.str_len(strings) == 19
+  try:
+    result[fast] = naiveToEpoch(strings[fast].astype("datetime64[s]").astype(numpy.int64))
+  except ValueError:
+    for i in numpy.flatnonzero(fast):
+      try:
+        result[i] = naiveToEpoch([numpy.datetime64(strings[i], "s").astype(numpy.int64)])[0]
+      except ValueError:
+        fast[i] = False
+  for i in numpy.flatnonzero(~fast):
+    result[i] = parseTimestampSlow(timestamps[i])
+  return result
+
+def _categorize(values):
+  'Return the ids of the values and the table of distinct values'
+  lookup = dict.fromkeys(values)
+  for i, k in enumerate(lookup):
+    lookup[k] = i
+  return numpy.fromiter(map(lookup.__getitem__, values), dtype=numpy.int32, count=len(values)), list(lookup)
+
+def _sharedMemory(size = 0, name = None):
+  '''Create the shared memory or attach to it by its name.
+  The parent process unlinks all blocks, from Python 3.13 on they are not tracked, before the workers register them with the resource tracker of the parent'''
+  if sys.version_info >= (3, 13):
+    return shared_memory.SharedMemory(name, create = name == None, size = size, track = False)
+  return shared_memory.SharedMemory(name, create = name == None, size = size)
+
+def _parseSlurmRange(task):
+  'Parse a range of bytes of a SLURM file in a worker process, the columns are copied into shared memory'
+  (filename, start, end, partition, limit) = task
+  with open(filename, "rb") as fd:
+    fd.seek(start)
+    lines = fd.read(end - start).decode("utf-8").splitlines(True)
+  if not lines:
+    trace = _emptyTrace()
+  else:
+    trace = BulkTraceParser(partition = partition)._slurmColumns(lines, limit)
+  shared = {}
+  blocks = []
+  try:
+    for name, col in trace.columns.items():
+      block = _sharedMemory(max(col.nbytes, 1))
+      blocks.append(block)
+      numpy.ndarray(len(col), dtype=col.dtype, buffer=block.buf)[:] = col
+      shared[name] = (block.name, col.dtype.str, len(col))
+  except BaseException:
+    for b in blocks:
+      b.close()
+      b.unlink()
+    raise
+  # the parent process unlinks the memory after copying the data
+  for b in blocks:
+    b.close()
+  return (shared, trace.categories)
+
+def _emptyTrace():
+  columns = {"jobid" : numpy.empty(0, dtype=str)}
+  for c in CATEGORICAL_COLUMNS:
+    columns[c] = numpy.empty(0, dtype=numpy.int32)
+  for c in ["submissionTime", "nodes", "PPN", "duration"]:
+    columns[c] = numpy.empty(0, dtype=numpy.int64)
+  for c in ["APC", "ETS"]:
+    columns[c] = numpy.empty(0, dtype=numpy.float64)
+  return JobTrace(columns, {c : [] for c in CATEGORICAL_COLUMNS})
+
+
+class BulkTraceParser:
+  '''Parses the prepared SLURM and the LRZ format chunk-wise into the columns of a JobTrace.
+  The parser keeps the state of one file, i.e., the number of jobs read and the last submission time, the chunks must be parsed in order.
+  The messages are the same as printed by the line-wise parser.'''
+
+  chunkLines = 100000
+
+  def __init__(self, limitCount = 10000000000, partition = None):
+    self.limitCount = limitCount
+    self.partition = partition
+    self.count = 0
+    self.oldsubmissionTime = 0
+
+  def limitReached(self):
+    return self.count >= self.limitCount
+
+  def chunks(self, fd, parseLines):
+    'Generator returning one JobTrace per chunk of lines, the header must have been read already'
+    while not self.limitReached():
+      lines = list(itertools.islice(fd, self.chunkLines))
+      if not lines:
+        return
+      yield parseLines(lines)
+
+  def parseFile(self, fd, parseLines):
+    'Parse the remaining lines of the file into a single trace'
+    return JobTrace.concatenate([_emptyTrace()] + list(self.chunks(fd, parseLines)))
+
+  def _splitLines(self, lines, fields):
+    'Split the lines into a list per field'
+    if not lines[-1].endswith("\n"):
+      lines[-1] = lines[-1] + "\n"
+    values = "".join(lines).replace("\n", "|").split("|")
+    count = len(lines)
+    if len(values) != fields * count + 1:
+      for l in lines:
+        if len(l.split("|")) != fields:
+          raise ValueError("[Reader] Error parsing line: %s" % l)
+    return [values[i:fields * count:fields] for i in range(0, fields)]
+
+  def parseSlurmLines(self, lines):
+    trace = self._slurmColumns(lines, self.limitCount - self.count)
+    if len(trace) > 0:
+      self._reportSlurm(trace.columns["submissionTime"])
+    return trace
+
+  def _slurmColumns(self, lines, limit):
+    'Convert the lines of the given partitions into a trace with up to limit jobs, this does not change the state of the parser'
+    (jobid, jobname, job_partition, NNodes, NTasks, ReqMem, Submit, Start, Elapsed, Account, User) = self._splitLines(lines, 16)[:11]
+    if self.partition != None:
+      rows = [i for i, p in enumerate(job_partition) if p in self.partition]
+    else:
+      rows = range(0, len(jobid))
+    rows = rows[:limit]
+    if len(rows) < len(jobid):
+      (jobid, jobname, job_partition, NNodes, NTasks, Submit, Elapsed, Account, User) = [[col[i] for i in rows] for col in (jobid, jobname, job_partition, NNodes, NTasks, Submit, Elapsed, Account, User)]
+    if not rows:
+      return _emptyTrace()
+
+    columns = {"jobid" : numpy.array(jobid, dtype=str)}
+    categories = {}
+    for c, values in [("name", jobname), ("account", Account), ("user", User), ("partition", job_partition)]:
+      (columns[c], categories[c]) = _categorize(values)
+    columns["submissionTime"] = parseTimestamps(Submit)
+    columns["nodes"] = numpy.array(NNodes, dtype=str).astype(numpy.int64)
+    columns["PPN"] = numpy.array(NTasks, dtype=str).astype(numpy.int64)
+    columns["duration"] = numpy.array(Elapsed, dtype=str).astype(numpy.int64)
+    columns["APC"] = numpy.full(len(rows), numpy.nan)
+    columns["ETS"] = numpy.full(len(rows), numpy.nan)
+    return JobTrace(columns, categories)
+
+  def parseSlurmFileParallel(self, filename, processes, chunkBytes = None):
+    '''Parse the SLURM file using a pool of processes, each parses a range of bytes that starts and ends at a line break.
+    The columns are returned in shared memory, the limit and the messages are applied after concatenating the ranges.'''
+    size = os.path.getsize(filename)
+    if chunkBytes == None:
+      chunkBytes = max(size // (4 * processes), 1024 * 1024)
+    with open(filename, "rb") as fd:
+      fd.readline()
+      offsets = [fd.tell()]
+      while offsets[-1] < size:
+        fd.seek(offsets[-1] + chunkBytes - 1)
+        fd.readline()
+        offsets.append(min(fd.tell(), size))
+
+    tasks = [(filename, start, end, self.partition, self.limitCount - self.count) for start, end in zip(offsets[:-1], offsets[1:])]
+    if sys.version_info < (3, 13):
+      # the workers share the resource tracker of this process, it removes the blocks left if this process dies
+      resource_tracker.ensure_running()
+    traces = [_emptyTrace()]
+    blocks = []
+    try:
+      # all ranges are collected before an error is raised, thus, the blocks of every worker are unlinked
+      with multiprocessing.Pool(processes) as pool:
+        results = [pool.apply_async(_parseSlurmRange, (t,)) for t in tasks]
+        parts = []
+        errors = []
+        for r in results:
+          try:
+            parts.append(r.get())
+          except Exception as e:
+            errors.append(e)
+      for (shared, categories) in parts:
+        columns = {}
+        for name, (blockName, dtype, count) in shared.items():
+          blocks.append(_sharedMemory(name = blockName))
+          columns[name] = numpy.ndarray(count, dtype=dtype, buffer=blocks[-1].buf)
+        traces.append(JobTrace(columns, categories))
+      if errors:
+        raise errors[0]
+      trace = JobTrace.concatenate(traces)
+    finally:
+      traces = None
+      columns = None
+      for b in blocks:
+        b.close()
+        b.unlink()
+
+    trace = trace[0:self.limitCount - self.count]
+    if len(trace) > 0:
+      self._reportSlurm(trace.columns["submissionTime"])
+    return trace
+
+  def _reportSlurm(self, submit):
+    'Print the warnings about unsorted submissions and the progress in the order of the line-wise parser'
+    previous = numpy.empty_like(submit)
+    previous[0] = self.oldsubmissionTime
+    previous[1:] = submit[:-1]
+    messages = [(i, 0, "[Reader] WARNING: submissions are not sorted incrementally, line: %d" % (self.count + 2 + i)) for i in numpy.flatnonzero(submit < previous).tolist()]
+    first = (self.count // 10000 + 1) * 10000
+    messages += [(c - self.count - 1, 1, str(c)) for c in range(first, self.count + len(submit) + 1, 10000)]
+    for m in sorted(messages):
+      print(m[2])
+
+    self.oldsubmissionTime = int(submit[-1])
+    self.count = self.count + len(submit)
+    if self.limitReached():
+      print("[Reader] Limit reached %d" % self.limitCount)
+
+  def parseLRZLines(self, lines):
+    (jobid, Submit, Start, End, State, EnergyTag, NNodes, ETS, apc) = self._splitLines(lines, 9)
+
+    submit = numpy.maximum(parseTimestamps(Submit), LRZ_FIRST_SUBMISSION) # fix too early start times
+    elapsed = parseTimestamps(End) - parseTimestamps(Start)
+    removed = (numpy.array(State, dtype=str) == "Removed") & (elapsed < 2)
+    valid = ~removed & (elapsed > 0)
+
+    # rows after the job that reaches the limit are not processed
+    rows = numpy.flatnonzero(valid)[:self.limitCount - self.count]
+    end = len(lines)
+    if self.count + len(rows) >= self.limitCount and len(rows) > 0:
+      end = rows[-1] + 1
+
+    messages = [(i, 0, "Job is empty! %s" % jobid[i]) for i in numpy.flatnonzero(~removed[:end] & ~valid[:end]).tolist()]
+    try:
+      APC = numpy.array(apc, dtype=str).astype(numpy.float64)
+    except ValueError:
+      APC = numpy.zeros(len(apc))
+      for i, v in enumerate(apc):
+        try:
+          APC[i] = float(v)
+        except ValueError:
+          if i < end and not removed[i]:
+            messages.append((i, 0, "Error parsing: %s (will set APC to 0)" % lines[i].strip()))
+    first = (self.count // 10000 + 1) * 10000
+    messages += [(int(rows[c - self.count - 1]), 1, str(c)) for c in range(first, self.count + len(rows) + 1, 10000)]
+    for m in sorted(messages):
+      print(m[2])
+    self.count = self.count + len(rows)
+    if self.limitReached():
+      print("[Reader] Limit reached %d" % self.limitCount)
+
+    columns = {"jobid" : numpy.array(jobid, dtype=str)[rows]}
+    (columns["name"], names) = _categorize([EnergyTag[i] for i in rows.tolist()])
+    for c in ["account", "user", "partition"]:
+      columns[c] = numpy.full(len(rows), -1, dtype=numpy.int32)
+    columns["submissionTime"] = submit[rows]
+    columns["nodes"] = numpy.array(NNodes, dtype=str).astype(numpy.int64)[rows]
+    columns["PPN"] = columns["nodes"]
+    columns["duration"] = elapsed[rows]
+    columns["APC"] = APC[rows]
+    columns["ETS"] = numpy.array([JobTrace._parseFloat(ETS[i]) for i in rows.tolist()], dtype=numpy.float64)
+    return JobTrace(columns, {"name" : names, "account" : [], "user" : [], "partition" : []})
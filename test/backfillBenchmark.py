@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# Run the backfilling schedulers on a synthetic overloaded workload whose queue grows to the given depth
+# The workload is run again with frequent node failures, thus, many jobs are aborted before their reserved end
+# usage: backfillBenchmark.py [queueDepth] [scheduler...]
+
+import contextlib
+import os
+import sys
+import time
+import numpy
+
+from schedSim.energyCosts import FixedPriceModel
+from schedSim.jobs import Job
+from schedSim.reporter import SilentReporter
+from schedSim.scheduler import SchedulerFactory
+from schedSim.simulator import Simulator
+
+exec(open(os.path.join(os.path.dirname(__file__), "..", "data", "test-trace", "configuration.py"), "r").read())
+
+def workload(depth, cluster):
+  'The first jobs are submitted at once, the remaining ones arrive as fast as jobs complete, thus, the queue keeps its depth'
+  numpy.random.seed(seed=3)
+  count = 3 * depth
+  nodes = numpy.minimum(numpy.random.geometric(0.02, count), cluster.nodes // 2)
+  runtime = numpy.random.exponential(4 * 3600, count).astype(numpy.int64) + 60
+  interval = int((nodes * runtime).mean() / cluster.nodes)
+  submit = numpy.concatenate([numpy.zeros(depth, dtype=numpy.int64), numpy.arange(1, count - depth + 1) * interval])
+  return [Job(i, "job", int(n), 1, int(t), [int(r)]) for i, (n, t, r) in enumerate(zip(nodes.tolist(), submit.tolist(), runtime.tolist()))]
+
+class FailingCluster(Cluster):
+  'A node fails every few hours, the aborted jobs end before their reservation'
+  nodeMTBF = 365*24*3600
+  nodeMTTR = 3600
+
+if __name__ == "__main__":
+  depth = 10000
+  if len(sys.argv) > 1:
+    depth = int(sys.argv[1])
+  schedulers = sys.argv[2:] or ["FIFOBackfill", "ConservativeBackfill"]
+  cluster = Cluster()
+  jobs = workload(depth, cluster)
+
+  for (clusterType, errorModel) in [(Cluster, False), (FailingCluster, True)]:
+    for name in schedulers:
+      reporter = SilentReporter()
+      numpy.random.seed(seed=3)
+      t0 = time.time()
+      with open(os.devnull, "w") as out, contextlib.redirect_stdout(out):
+        Simulator().simulate(clusterType(), list(jobs), SchedulerFactory().createScheduler(name, ""), FixedPriceModel(), reporter, errorModel)
+      dt = time.time() - t0
+      print("%s%s: %d jobs %.2fs = %.0f jobs/s, utilization: %.1f %%, aborted: %d" % (name, " with failures" if errorModel else "", len(jobs), dt, len(jobs) / dt, reporter.stats["utilization_percent"], reporter.stats["jobsAborted"]))
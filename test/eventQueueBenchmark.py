@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# Compare the EventQueue of the simulator with a heapq of (time, op, job) tuples
+# usage: eventQueueBenchmark.py [events]
+
+import sys
+import time
+import numpy
+
+from heapq import heappop, heappush
+from schedSim.eventQueue import EventQueue
+from schedSim.jobs import Job
+
+def workload(count):
+  'Submissions in bursts of the same second, completions after a runtime, like in HPC traces'
+  numpy.random.seed(seed=3)
+  submit = numpy.cumsum(numpy.random.poisson(2, count) * (numpy.random.random(count) < 0.3))
+  runtime = numpy.random.exponential(3600, count).astype(numpy.int64) + 1
+  jobs = [Job(i, "job", 1, 1, int(t), [int(r)]) for i, (t, r) in enumerate(zip(submit.tolist(), runtime.tolist()))]
+  return jobs
+
+def runHeap(jobs):
+  el = []
+  for j in jobs:
+    heappush(el, (j.submissionTime, 1, j))
+  while el:
+    (t, op, job) = heappop(el)
+    if op == 1:
+      heappush(el, (t + job.durationMin, 2, job))
+
+def runEventQueue(jobs):
+  el = EventQueue()
+  for j in jobs:
+    el.push(j.submissionTime, 1, j)
+  while el:
+    (t, op, job) = el.pop()
+    if op == 1:
+      el.push(t + job.durationMin, 2, job)
+
+if __name__ == "__main__":
+  count = 1000000
+  if len(sys.argv) > 1:
+    count = int(sys.argv[1])
+  jobs = workload(count)
+
+  for name, run in [("heapq", runHeap), ("EventQueue", runEventQueue)]:
+    t0 = time.time()
+    run(jobs)
+    dt = time.time() - t0
+    print("%s: %d events %.2fs = %.0f events/s" % (name, 2 * count, dt, 2 * count / dt))
@@ -9,31 +9,50 @@ import importlib
 
 from schedSim.energyCosts import energyCostModelFactory
 from schedSim.jobReader import JobReader
+from schedSim.traceCache import TraceCache
+from schedSim.jobTrace import JobTrace
 from schedSim.jobs import Job
-from schedSim.simulator import Simulator
-from schedSim.reporterUtilization import ReporterUtilization
+from schedSim.simulator import Simulator, Branch
+from schedSim.reporterUtilization import ReporterUtilization, ReporterUtilizationBinary, statisticsToCSV
+from schedSim.reporterHTML import TimelineSink
 from schedSim.scheduler import SchedulerFactory
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser( description='Simulator for BatchJobs' )
 
   parser.add_argument("--input", type=str, help="the input file")
-  parser.add_argument('--convert', type=str, help='Convert the data using pickle, define the output file (for convert)')
-  parser.add_argument('--prepareCSV', type=str, help='Convert the CSV data dumped by SLURM, define the output file (for convert)')
+  parser.add_argument('--convert', type=str, help='Convert the data, define the output file (for convert), files ending with .trace use the columnar format otherwise pickle')
+  parser.add_argument('--prepareCSV', type=str, help='Convert the CSV data dumped by SLURM, define the output file (for convert), the input may be a comma separated list of files')
   parser.add_argument('--limit-count', type=int, help='Limit the number of operations to process')
   parser.add_argument('--scheduler', type=str, help='The scheduling algorithm to use (use list to see available)', default="FIFO")
   parser.add_argument('--scheduler-argument', type=str, help='Any argument for the scheduler', default="")
   parser.add_argument('--error-model', type=bool, help='Use the error model True')
   parser.add_argument('--energy-model', type=str, help='The energy model to use (use list to see available)', default="FixedPrice")
   parser.add_argument('--energy-model-argument', type=str, help='The model argument to use', default="data/eex/T1.csv")
+  parser.add_argument('--binary-stats', action="store_true", help='Write the statistics into a binary file instead of the CSV file', default=False)
+  parser.add_argument('--stats-to-csv', type=str, help='Convert the binary statistics of the input file into the given CSV file')
+  parser.add_argument('--timeline', action="store_true", help='Write the jobs and the utilization into an HTML timeline with level of detail tiles', default=False)
   parser.add_argument('--report-outname', type=str, help='The name of the output file', default="output")
   parser.add_argument('--configuration', type=str, help='The configuration file', default="")
   parser.add_argument('--print_jobs', action="store_true", help='Print the jobs', default=False)
+  parser.add_argument('--stream', action="store_true", help='Stream the jobs from the input file while simulating instead of loading them upfront, the input must be sorted by submission time', default=False)
+  parser.add_argument('--cache', action="store_true", help='Cache parsed text input files in the columnar format and reuse them', default=False)
+  parser.add_argument('--cache-dir', type=str, help='The directory of the cache of parsed traces, by default $SCHEDSIM_CACHE or ~/.cache/schedsim, implies --cache')
+  parser.add_argument('--node-allocation', type=str, help='Track the state of every node and allocate the nodes of a job firstFit or contiguous', default=None)
+  parser.add_argument('--snapshot', type=str, help='Write snapshots of the simulation to this file, by default <report-outname>.snapshot if an interval is given')
+  parser.add_argument('--snapshot-interval', type=int, help='Write a snapshot every given simulated seconds')
+  parser.add_argument('--snapshot-wall-interval', type=int, help='Write a snapshot every given seconds of the wall clock')
+  parser.add_argument('--resume', action="store_true", help='Continue the simulation from the snapshot, the input must be the same', default=False)
+  parser.add_argument('--fork-time', type=int, help='Fork the branches at the given simulated time (seconds since the epoch), by default after the first events')
+  parser.add_argument('--branch', type=str, action="append", help='A branch that continues the simulation from --fork-time: name,scheduler,scheduler-argument,energy-model,energy-model-argument, empty fields keep the setting of the simulation, -<name> is appended to the names of the output files')
+  parser.add_argument('--defer-energy', action="store_true", help='Record the power consumption and compute the energy costs at the end of the simulation', default=False)
   parser.add_argument('--set_submission_time_zero', action="store_true", help='Set all submission times to zero', default=False)
 
   args = parser.parse_args()
 
   jobspawner = JobReader()
+  if args.cache or args.cache_dir:
+    jobspawner.cache = TraceCache(args.cache_dir)
   o_scheduler = "all"
   errorModel = False
   limitCount = 100000000
@@ -43,9 +62,13 @@ if __name__ == "__main__":
 
   inputFile = args.input
 
+  if args.stats_to_csv:
+    statisticsToCSV(inputFile, args.stats_to_csv)
+    sys.exit(0)
+
   if args.prepareCSV:
     print("Converting!")
-    jobspawner.prepareSlurm([inputFile], args.prepareCSV)
+    jobspawner.prepareSlurm(inputFile.split(","), args.prepareCSV)
     sys.exit(0)
 
   if args.limit_count:
@@ -55,18 +78,20 @@ if __name__ == "__main__":
   if args.error_model:
     errorModel = args.error_model
 
-  # jobspawner.prepareSlurm(["jobs-2015.txt", "jobs-2016.txt"], "jobs-dkrz.txt")
   energyModel = energyCostModelFactory.createModel(args.energy_model, args.energy_model_argument)
 
   schedFactory = SchedulerFactory()
   scheduler = schedFactory.createScheduler(args.scheduler, args.scheduler_argument)
 
   print("Parsing")
-  t0 = time.clock()
+  t0 = time.time()
   #jobs = jobspawner.jobs("data/dkrz/jobs-dkrz.txt", limitCount=limitCount)
-  jobs = jobspawner.jobs(inputFile, limitCount=limitCount)
+  if args.stream and not (args.convert or args.print_jobs or args.set_submission_time_zero):
+    jobs = jobspawner.streamJobs(inputFile, limitCount=limitCount)
+  else:
+    jobs = jobspawner.jobs(inputFile, limitCount=limitCount)
   #jobs = jobspawner.jobs("data/dkrz/jobs-dkrz.p", limitCount=limitCount, partition=["compute"])
-  dt = time.clock() - t0
+  dt = time.time() - t0
   print("Parsing time: %.1fs" % dt)
 
   if args.convert:
@@ -74,6 +99,8 @@ if __name__ == "__main__":
     sys.exit(1)
 
   if args.set_submission_time_zero:
+    if isinstance(jobs, JobTrace):
+      jobs = jobs.toJobs()
     for j in jobs:
       j.submissionTime = 1433023200
 
@@ -85,8 +112,32 @@ if __name__ == "__main__":
   cluster = Cluster()
 
   sim = Simulator()
+  sim.nodeAllocation = args.node_allocation
+  sim.snapshotFile = args.snapshot
+  if sim.snapshotFile == None and (args.snapshot_interval or args.snapshot_wall_interval or args.resume):
+    sim.snapshotFile = args.report_outname + ".snapshot"
+  sim.snapshotInterval = args.snapshot_interval
+  sim.snapshotWallInterval = args.snapshot_wall_interval
+  if args.branch:
+    sim.forkTime = args.fork_time or 0
+    sim.branches = []
+    for b in args.branch:
+      fields = (b.split(",") + ["", "", "", ""])[:5]
+      branchScheduler = schedFactory.createScheduler(fields[1], fields[2]) if fields[1] else None
+      branchEnergyModel = energyCostModelFactory.createModel(fields[3], fields[4]) if fields[3] else None
+      sim.branches.append(Branch(fields[0], branchScheduler, branchEnergyModel))
+  if args.resume:
+    sim.resume(sim.snapshotFile, jobs)
+    sys.exit(0)
 
-  sim.simulate(cluster, jobs, scheduler, energyModel, ReporterUtilization(args.report_outname), errorModel)
+  if args.binary_stats:
+    reporter = ReporterUtilizationBinary(args.report_outname)
+  else:
+    reporter = ReporterUtilization(args.report_outname)
+  if args.timeline:
+    reporter.attach(TimelineSink(args.report_outname))
+  reporter.accounting.deferEnergy = args.defer_energy
+  sim.simulate(cluster, jobs, scheduler, energyModel, reporter, errorModel)
 
   sys.exit(0)
 
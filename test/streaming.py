@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# Check that streamed jobs are added to the event list only shortly before their submission
+# usage: streaming.py [jobs]
+
+import os
+import sys
+
+import schedSim.simulator
+from schedSim.energyCosts import FixedPriceModel
+from schedSim.eventQueue import EventQueue
+from schedSim.jobs import Job
+from schedSim.reporter import SilentReporter
+from schedSim.scheduler import FIFOScheduler
+
+class CountingEventQueue(EventQueue):
+  'Record the largest number of events in the queue'
+  peak = 0
+
+  def push(self, time, op, job):
+    EventQueue.push(self, time, op, job)
+    CountingEventQueue.peak = max(CountingEventQueue.peak, len(self))
+
+def jobs(count):
+  'Short jobs in bursts of ten, an idle gap follows every burst'
+  for i in range(count):
+    yield Job(i, "job", 1, 1, 1427000000 + (i // 10) * 3600, [60])
+
+if __name__ == "__main__":
+  count = 20000
+  if len(sys.argv) > 1:
+    count = int(sys.argv[1])
+
+  exec(open(os.path.dirname(os.path.abspath(__file__)) + "/../data/test-trace/configuration.py", "r").read())
+
+  schedSim.simulator.EventQueue = CountingEventQueue
+  sim = schedSim.simulator.Simulator()
+  sim.simulate(Cluster(), jobs(count), FIFOScheduler(), FixedPriceModel(), SilentReporter(), False)
+
+  print("Largest event list: %d events for %d jobs" % (CountingEventQueue.peak, count))
+  # without the error model the event list runs empty in every gap, only the next burst may be added then
+  assert CountingEventQueue.peak <= 20, "the streamed jobs are not bounded"